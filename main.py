@@ -9,7 +9,7 @@ from time import time
 import aiofiles
 import orjson
 from loguru import logger
-from telethon import TelegramClient, errors, events, functions, types
+from telethon import TelegramClient, events, functions, types
 from telethon.helpers import TotalList
 from telethon.network.connection import ConnectionTcpObfuscated
 from telethon.tl.custom import Message
@@ -62,7 +62,6 @@ class UserbotManager:
         self.phone = phone
         self.settings = settings.UBSettings(phone, pathes.clients)
         self.session_path = Path("sessions") / phone
-        self.voice_path = pathes.voice / phone
         self.client = TelegramClient(
             session=str(self.session_path),
             api_id=api_id,
@@ -82,12 +81,25 @@ class UserbotManager:
         self.battery_task = task_gen.Generator(f"{phone}_battery")
         self.batt_state = True
         self.notes = notes.Notes(phone)
+        self.governor = ratelimit.Governor()
+        self.read_acker = ratelimit.ReadAcker(
+            self.client,
+            self.governor,
+            (config.config.governor or {}).get("read_ack", 0.5),
+        )
         self.flood_ctrl = flood.FloodController(self.client, self.settings)
-        self.autochat = autochat.AutoChatManager(self.client, self.settings)
+        self.autochat = autochat.AutoChatManager(
+            self.client, self.settings, self.governor
+        )
         self.vktarget = vktarget_bot.VKTargetRefactored(
-            self.client, self.settings, logger
+            self.client, self.settings, logger, self.governor
+        )
+        self.clickbee = clickbee.ClickBeeAutomation(
+            self.client, self.settings, self.governor
         )
-        self.clickbee = clickbee.ClickBeeAutomation(self.client, self.settings)
+        self.router = d.Router()
+        self.me_id: int | None = None
+        self.mask_read: set[int] = set()
         self._stopped = False
 
     async def init(self):
@@ -98,6 +110,7 @@ class UserbotManager:
                 api_key=await self.settings.get("groq.token"),
                 proxy=await self.settings.get("groq.proxy"),
                 chat_model=await self.settings.get("ai.model"),
+                history_tokens=int(await self.settings.get("ai.history_tokens")),
             )
             self.ai_client.init_client()
             self.ai_chat = self.ai_client.chat(self.phone)
@@ -105,10 +118,15 @@ class UserbotManager:
             logger.warning("Установите Groq-токен (.иитокен <токен>)")
         await self.client.start(phone=self.phone)  # ty:ignore[invalid-await]
         logger.info(f"Запущен клиент ({self.phone})")
+        self.me_id = (await self.client.get_me()).id
+        self.mask_read = set(await self.settings.get("mask.read") or [])
+        await self.flood_ctrl.load()
         self._register_handlers()
 
         if await self.settings.get("block.voice"):
-            self.client.add_event_handler(self.block_voice, events.NewMessage())
+            self.client.add_event_handler(
+                self.block_voice, events.NewMessage(func=self._is_foreign_voice)
+            )
 
         if await self.settings.get("luminto.reactions"):
             for chat in ("lumintoch", "trassert_ch"):
@@ -168,108 +186,96 @@ class UserbotManager:
             )
 
     def _register_handlers(self):
-        self.client.on(d.cmd(r"\.тгвк$"))(self.toggle_tg_to_vk)
-
-        self.client.on(d.cmd(r"\.\$(.+)"))(self.run_shell)
-
-        self.client.on(d.cmd(r"\+нот (.+)\n([\s\S]+)"))(self.add_note)
-        self.client.on(d.cmd(r"\-нот (.+)"))(self.rm_note)
-        self.client.on(d.cmd(r"\!(.+)"))(self.chk_note)
-        self.client.on(d.cmd(r"\.ноты$"))(self.list_notes)
-
-        self.client.on(d.cmd(r"\.чистка$"))(self.clean_pm)
-        self.client.on(d.cmd(r"\.help$"))(self.help)
-        self.client.on(d.cmd(r"\.помощь$"))(self.help)
-        self.client.on(d.cmd(r"\.чсчистка$"))(self.clean_blacklist)
-        self.client.on(d.cmd(r"\.voice$"))(self.voice2text)
-        self.client.on(d.cmd(r"\.баттмон$"))(self.toggle_batt)
-        self.client.on(d.cmd(r"\.чатчистка$"))(self.clean_chat)
-        self.client.on(d.cmd(r"\.слов"))(self.words)
-        self.client.on(d.cmd(r"\.пинг$"))(self.ping)
-        self.client.on(d.cmd(r"\.эмоид$"))(self.get_emo_id)
-        self.client.on(d.cmd(r"\.флип"))(self.flip_text)
-        self.client.on(d.cmd(r"\.гс$"))(self.on_off_block_voice)
-        self.client.on(d.cmd(r"\.читать$"))(self.on_off_mask_read)
-        self.client.on(d.cmd(r"\.серв$"))(self.server_load)
-        self.client.on(d.cmd(r"\.релоадконфиг$"))(self.config_reload)
-        self.client.on(d.cmd(r"\.автоферма$"))(self.on_off_farming)
-        self.client.on(d.cmd(r"\.онлайн$"))(self.toggle_online)
-        self.client.on(d.cmd(r"\.автобонус$"))(self.on_off_bonus)
-        self.client.on(d.cmd(r"\.авто vktarget_bot$"))(self.toggle_vktarget)
-        self.client.on(d.cmd(r"\.авто clickbee$"))(self.clickbee.toggle)
-
-        self.client.on(d.cmd(r"\.id (.+)"))(self.get_id)
-
-        self.client.on(d.cmd(r"\.иичистка"))(self.ai_clear)
-        self.client.on(d.cmd(r"\.иипрокси (.+)"))(self.ai_proxy)
-        self.client.on(d.cmd(r"\.иитокен (.+)"))(self.ai_token)
-        self.client.on(d.cmd(r"\.иимодель (.+)"))(self.ai_model)
-
-        self.client.on(d.cmd(r"\.прокси(.*)"))(self.fp)
-        self.client.on(d.cmd(r"\.погода (.+)"))(self.get_weather)
-        self.client.on(d.cmd(r"\.ip (.+)"))(self.ipman)
-        self.client.on(d.cmd(r"\.кв (.+)"))(self.currencyconventer)
-        self.client.on(d.cmd(r"\.аним (.+)"))(self.anim)
-        self.client.on(d.cmd(r"\.ии ([\s\S]+)"))(self.ai_resp)
-        self.client.on(d.cmd(r"\.т ([\s\S]+)"))(self.typing)
-        self.client.on(d.cmd(r"\.set (.+)"))(self.set_setting)
-        self.client.on(d.cmd(r"\.setint (.+)"))(self.set_int_setting)
-        self.client.on(d.cmd(r"\.время (.+)"))(self.time_by_city)
-        self.client.on(d.cmd(r"\.ад(?:\s|$)"))(self.autodelmsg)
+        on = self.router.on
+
+        on(r"\.тгвк$")(self.toggle_tg_to_vk)
+
+        on(r"\.\$(.+)")(self.run_shell)
+
+        on(r"\+нот (.+)\n([\s\S]+)")(self.add_note)
+        on(r"\-нот (.+)")(self.rm_note)
+        on(r"\!(.+)")(self.chk_note)
+        on(r"\.ноты$")(self.list_notes)
+
+        on(r"\.чистка$")(self.clean_pm)
+        on(r"\.help$")(self.help)
+        on(r"\.помощь$")(self.help)
+        on(r"\.чсчистка$")(self.clean_blacklist)
+        on(r"\.voice$")(self.voice2text)
+        on(r"\.баттмон$")(self.toggle_batt)
+        on(r"\.чатчистка$")(self.clean_chat)
+        on(r"\.слов")(self.words)
+        on(r"\.пинг$")(self.ping)
+        on(r"\.эмоид$")(self.get_emo_id)
+        on(r"\.флип")(self.flip_text)
+        on(r"\.гс$")(self.on_off_block_voice)
+        on(r"\.читать$")(self.on_off_mask_read)
+        on(r"\.серв$")(self.server_load)
+        on(r"\.релоадконфиг$")(self.config_reload)
+        on(r"\.автоферма$")(self.on_off_farming)
+        on(r"\.онлайн$")(self.toggle_online)
+        on(r"\.автобонус$")(self.on_off_bonus)
+        on(r"\.авто vktarget_bot$")(self.toggle_vktarget)
+        on(r"\.авто clickbee$")(self.clickbee.toggle)
+
+        on(r"\.id (.+)")(self.get_id)
+
+        on(r"\.иичистка")(self.ai_clear)
+        on(r"\.иипрокси (.+)")(self.ai_proxy)
+        on(r"\.иитокен (.+)")(self.ai_token)
+        on(r"\.иимодель (.+)")(self.ai_model)
+
+        on(r"\.прокси(.*)")(self.fp)
+        on(r"\.погода (.+)")(self.get_weather)
+        on(r"\.ip (.+)")(self.ipman)
+        on(r"\.кв (.+)")(self.currencyconventer)
+        on(r"\.аним (.+)")(self.anim)
+        on(r"\.ии ([\s\S]+)")(self.ai_resp)
+        on(r"\.т ([\s\S]+)")(self.typing)
+        on(r"\.set (.+)")(self.set_setting)
+        on(r"\.setint (.+)")(self.set_int_setting)
+        on(r"\.время (.+)")(self.time_by_city)
+        on(r"\.ад(?:\s|$)")(self.autodelmsg)
+
+        on(r"\.genpass(?:\s+(.+))?")(self.gen_pass)
+        on(r"\.генпасс(?:\s+(.+))?")(self.gen_pass)
+        on(r"\.пароль(?:\s+(.+))?")(self.gen_pass)
 
         self.client.on(
-            d.cmd(
-                r"\.genpass(?:\s+(.+))?",
-            ),
-        )(self.gen_pass)
-        self.client.on(
-            d.cmd(
-                r"\.генпасс(?:\s+(.+))?",
-            ),
-        )(self.gen_pass)
-        self.client.on(
-            d.cmd(
-                r"\.пароль(?:\s+(.+))?",
-            ),
-        )(self.gen_pass)
-
-        self.client.on(events.NewMessage())(self.flood_ctrl.monitor)
-        self.client.on(d.cmd(r"\-флудстики (\d+) (\d+)$"))(
-            lambda e: self.flood_ctrl.set_rule(e, "stickers"),
-        )
-        self.client.on(d.cmd(r"\-флудгиф (\d+) (\d+)$"))(
-            lambda e: self.flood_ctrl.set_rule(e, "gifs"),
-        )
-        self.client.on(d.cmd(r"\-флудобщ (\d+) (\d+)$"))(
-            lambda e: self.flood_ctrl.set_rule(e, "messages"),
-        )
-        self.client.on(d.cmd(r"\+флудстики$"))(
-            lambda e: self.flood_ctrl.unset_rule(e, "stickers")
+            events.NewMessage(func=lambda e: e.chat_id in self.flood_ctrl.chats)
+        )(self.flood_ctrl.monitor)
+        on(r"\-флудстики (\d+) (\d+)$")(
+            lambda e: self.flood_ctrl.set_rule(e, "stickers")
         )
-        self.client.on(d.cmd(r"\+флудгиф$"))(
-            lambda e: self.flood_ctrl.unset_rule(e, "gifs")
+        on(r"\-флудгиф (\d+) (\d+)$")(lambda e: self.flood_ctrl.set_rule(e, "gifs"))
+        on(r"\-флудобщ (\d+) (\d+)$")(
+            lambda e: self.flood_ctrl.set_rule(e, "messages")
         )
-        self.client.on(d.cmd(r"\+флудобщ$"))(
-            lambda e: self.flood_ctrl.unset_rule(e, "messages")
-        )
-
-        self.client.on(d.cmd(r"\+авточат (-?\d+)"))(self.autochat.add_chat)
-        self.client.on(d.cmd(r"\-авточат (-?\d+)"))(self.autochat.remove_chat)
-        self.client.on(d.cmd(r"\.авточат$"))(self.autochat.toggle)
-        self.client.on(d.cmd(r"\.авточаттайм (\d+)"))(self.autochat.set_delay)
-
-        self.client.on(d.cmd(r"\.калк (.+)"))(self.calc)
-        self.client.on(d.cmd(r"\.к (.+)"))(self.calc)
-        self.client.on(d.cmd(r"\.calc (.+)"))(self.calc)
-
-        self.client.on(d.cmd(r"\.телемт$"))(self.telemt_info)
-        self.client.on(d.cmd(r"\.telemt$"))(self.telemt_info)
-        self.client.on(d.cmd(r"\+телемт юзер (.+)"))(self.telemt_adduser)
-        self.client.on(d.cmd(r"\+telemt user (.+)"))(self.telemt_adduser)
-        self.client.on(d.cmd(r"\-телемт юзер (.+)"))(self.telemt_deluser)
-        self.client.on(d.cmd(r"\-telemt user (.+)"))(self.telemt_deluser)
+        on(r"\+флудстики$")(lambda e: self.flood_ctrl.unset_rule(e, "stickers"))
+        on(r"\+флудгиф$")(lambda e: self.flood_ctrl.unset_rule(e, "gifs"))
+        on(r"\+флудобщ$")(lambda e: self.flood_ctrl.unset_rule(e, "messages"))
+
+        on(r"\+авточат (-?\d+)")(self.autochat.add_chat)
+        on(r"\-авточат (-?\d+)")(self.autochat.remove_chat)
+        on(r"\.авточат$")(self.autochat.toggle)
+        on(r"\.авточаттайм (\d+)")(self.autochat.set_delay)
+        on(r"\.авточатрежим (\w+)")(self.autochat.set_mode)
+
+        on(r"\.калк (.+)")(self.calc)
+        on(r"\.к (.+)")(self.calc)
+        on(r"\.calc (.+)")(self.calc)
+
+        on(r"\.телемт$")(self.telemt_info)
+        on(r"\.telemt$")(self.telemt_info)
+        on(r"\+телемт юзер (.+)")(self.telemt_adduser)
+        on(r"\+telemt user (.+)")(self.telemt_adduser)
+        on(r"\-телемт юзер (.+)")(self.telemt_deluser)
+        on(r"\-telemt user (.+)")(self.telemt_deluser)
 
-        self.client.on(events.NewMessage())(self._dynamic_mask_reader)
+        self.client.on(
+            events.NewMessage(func=lambda e: e.chat_id in self.mask_read)
+        )(self._dynamic_mask_reader)
+        self.client.add_event_handler(self.router.dispatch, self.router.builder())
 
     async def stop(self):
         """Disconnect the client and cancel background tasks."""
@@ -287,6 +293,10 @@ class UserbotManager:
                 task.stop()
         with contextlib.suppress(Exception):
             self.vktarget.stop()
+        with contextlib.suppress(Exception):
+            await self.read_acker.flush()
+        with contextlib.suppress(Exception):
+            await self.settings.flush()
         with contextlib.suppress(Exception):
             await self.client.disconnect()
         logger.info(f"Клиент ({self.phone}) остановлен.")
@@ -388,36 +398,59 @@ class UserbotManager:
 
         await event.edit(phrase.clear.start)
 
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1000)
         kicked = 0
         unbanned = 0
+        next_report = 0.0
+
+        async def produce(kind=None):
+            async for user in self.client.iter_participants(chat, filter=kind):
+                if user.deleted:
+                    await queue.put((kind is not None, user))
+
+        async def report():
+            nonlocal next_report
+            if time() < next_report:
+                return
+            next_report = time() + 3
+            with contextlib.suppress(Exception):
+                await event.edit(
+                    phrase.clear.progress.format(kicked=kicked, unbanned=unbanned)
+                )
 
-        async for user in self.client.iter_participants(chat):
-            if user.deleted:
+        async def consume():
+            nonlocal kicked, unbanned
+            while True:
+                banned, user = await queue.get()
                 try:
-                    await self.client.kick_participant(chat, user.id)
-                    kicked += 1
-                    if kicked % 5 == 0:
-                        await event.edit(phrase.clear.kick.format(count=kicked))
+                    if banned:
+                        await self.governor.call(
+                            self.client.edit_permissions,
+                            chat,
+                            user,
+                            view_messages=True,
+                        )
+                        unbanned += 1
+                    else:
+                        await self.governor.call(
+                            self.client.kick_participant, chat, user.id
+                        )
+                        kicked += 1
+                    await report()
                 except Exception:
-                    logger.trace("Не могу удалить участника")
-            await asyncio.sleep(await self.settings.get("typing.delay"))
+                    logger.trace(f"Не могу обработать участника {user.id}")
+                finally:
+                    queue.task_done()
 
-        async for ban in self.client.iter_participants(
-            chat,
-            filter=types.ChannelParticipantsKicked,
-        ):
-            user: User = ban
-            if user and user.deleted:
-                try:
-                    await self.client.edit_permissions(
-                        chat, user, view_messages=True
-                    )
-                    unbanned += 1
-                    if unbanned % 5 == 0:
-                        await event.edit(phrase.clear.unban.format(count=unbanned))
-                except Exception:
-                    logger.trace("Не могу вынести из бана участника")
-            await asyncio.sleep(await self.settings.get("typing.delay"))
+        consumers = [asyncio.create_task(consume()) for _ in range(4)]
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(produce())
+                tg.create_task(produce(types.ChannelParticipantsKicked))
+            await queue.join()
+        finally:
+            for task in consumers:
+                task.cancel()
 
         if kicked or unbanned:
             await event.edit(
@@ -716,54 +749,52 @@ class UserbotManager:
         enabled = not await self.settings.get("block.voice")
         await self.settings.set("block.voice", enabled)
         if enabled:
-            self.client.add_event_handler(self.block_voice, events.NewMessage())
+            self.client.add_event_handler(
+                self.block_voice, events.NewMessage(func=self._is_foreign_voice)
+            )
             await event.edit(phrase.voice.block)
         else:
             self.client.remove_event_handler(self.block_voice)
             await event.edit(phrase.voice.unblock)
 
     async def on_off_mask_read(self, event: Message):
-        mask_read_chats = await self.settings.get("mask.read") or []
-        if event.chat_id in mask_read_chats:
-            mask_read_chats.remove(event.chat_id)
+        if event.chat_id in self.mask_read:
+            self.mask_read.discard(event.chat_id)
             await event.edit(phrase.read.off)
         else:
-            mask_read_chats.append(event.chat_id)
+            self.mask_read.add(event.chat_id)
             await event.edit(phrase.read.on)
-        await self.settings.set("mask.read", mask_read_chats)
+        await self.settings.set("mask.read", sorted(self.mask_read))
 
     async def _dynamic_mask_reader(self, event: Message):
-        mask_read_chats = await self.settings.get("mask.read") or []
-        if event.chat_id in mask_read_chats:
-            await event.mark_read()
+        self.read_acker.ack(event.chat_id, event.id)
+
+    def _is_foreign_voice(self, event: Message) -> bool:
+        "Синхронный префильтр block_voice: чужое голосовое в личке."
+        return (
+            isinstance(event.peer_id, PeerUser)
+            and event.sender_id != self.me_id
+            and isinstance(event.media, MessageMediaDocument)
+            and bool(event.media.voice)
+        )
 
     async def block_voice(self, event: Message):
-        if not isinstance(event.peer_id, PeerUser):
-            return
-        me = await self.client.get_me()
-        if me.id == event.sender_id:
-            return
-        if isinstance(event.media, MessageMediaDocument) and event.media.voice:
-            await event.delete()
-            msg = await self.settings.get(
-                "voice.message", phrase.voice.default_message
-            )
-            await event.respond(msg)
+        await event.delete()
+        msg = await self.settings.get("voice.message", phrase.voice.default_message)
+        await event.respond(msg)
 
     async def voice2text(self, event: Message):
         reply: Message = await event.get_reply_message()
         if not reply or not reply.voice:
             return await event.edit(phrase.voicerec.no_reply)
 
-        file_path = self.voice_path / f"voice_{event.id}.ogg"
-        await reply.download_media(file=str(file_path))
-
+        doc_id = reply.document.id
         try:
-            return await event.edit(
-                phrase.voicerec.done.format(
-                    await self.ai_client.transcribe_voice(self.phone, event.id),
-                ),
-            )
+            text = self.ai_client.transcripts.get(doc_id)
+            if text is None:
+                audio = await reply.download_media(file=bytes)
+                text = await self.ai_client.transcribe_voice(audio, doc_id)
+            return await event.edit(phrase.voicerec.done.format(text))
 
         except Exception as e:
             logger.exception("Ошибка при распознавании голоса")
@@ -829,31 +860,48 @@ class UserbotManager:
         return None
 
     async def clean_pm(self, event: Message):
-        dialogs = await self.client.get_dialogs()
-        deleted_count = 0
+        slots = asyncio.Semaphore(8)
         msg = await event.edit(phrase.pm.wait.format(0))
         deleted = []
-        for dialog in dialogs:
+        deleted_count = 0
+
+        async def is_empty(dialog) -> bool:
             user: User = dialog.entity
-            if not isinstance(user, User):
-                continue
-            on_delete = False
             if user.deleted:
-                on_delete = True
-            else:
-                messages: TotalList = await self.client.get_messages(
-                    user.id, limit=10
-                )
-                if all(isinstance(msg, MessageService) for msg in messages):
-                    on_delete = True
-            if on_delete:
+                return True
+            if dialog.message is not None and not isinstance(
+                dialog.message, MessageService
+            ):
+                return False
+            messages: TotalList = await self.governor.call(
+                self.client.get_messages, user.id, limit=10
+            )
+            return all(isinstance(m, MessageService) for m in messages)
+
+        async def process(dialog):
+            nonlocal deleted_count
+            user: User = dialog.entity
+            try:
+                if not await is_empty(dialog):
+                    return
+                await self.governor.call(self.client.delete_dialog, dialog.id)
                 if user.first_name:
                     deleted.append(f"[{user.first_name}](tg://user?id={user.id})")
-                await self.client.delete_dialog(dialog.id)
-                await asyncio.sleep(await self.settings.get("typing.delay"))
                 deleted_count += 1
                 if deleted_count % 5 == 0:
-                    await msg.edit(phrase.pm.wait.format(deleted_count))
+                    with contextlib.suppress(Exception):
+                        await msg.edit(phrase.pm.wait.format(deleted_count))
+            except Exception:
+                logger.trace(f"Не удалось проверить диалог {dialog.id}")
+            finally:
+                slots.release()
+
+        async with asyncio.TaskGroup() as tg:
+            async for dialog in self.client.iter_dialogs():
+                if not isinstance(dialog.entity, User):
+                    continue
+                await slots.acquire()
+                tg.create_task(process(dialog))
 
         await event.edit(
             phrase.pm.cleared.format(chats=deleted_count, list=", ".join(deleted))
@@ -867,8 +915,8 @@ class UserbotManager:
         msg = await event.edit(phrase.blacklist.scanning)
 
         while True:
-            await asyncio.sleep(await self.settings.get("typing.delay"))
-            result = await self.client(
+            result = await self.governor.request(
+                self.client,
                 functions.contacts.GetBlockedRequest(offset=offset, limit=limit),
             )
             blocked.extend(result.users)
@@ -888,14 +936,10 @@ class UserbotManager:
             name = user.first_name or f"@{user.id}"
             removed_names.append(f"[{name}](tg://user?id={user.id})")
 
-            try:
-                await self.client(functions.contacts.UnblockRequest(id=user.id))
-                removed_count += 1
-
-            except errors.FloodWaitError as e:
-                await asyncio.sleep(e.seconds)
-                await self.client(functions.contacts.UnblockRequest(id=user.id))
-                removed_count += 1
+            await self.governor.request(
+                self.client, functions.contacts.UnblockRequest(id=user.id)
+            )
+            removed_count += 1
 
             if removed_count % 25 == 0 and removed_count > 0:
                 await msg.edit(phrase.blacklist.progress.format(count=removed_count))
@@ -914,30 +958,30 @@ class UserbotManager:
     async def set_setting(self, event: Message):
         key, value = event.pattern_match.group(1).split(" ", maxsplit=1)
         await self.settings.set(key, value)
+        if key.startswith("autochat."):
+            await self.autochat.reload()
         await event.edit(phrase.setting.set.format(key=key, value=value))
 
     async def set_int_setting(self, event: Message):
         key, value = event.pattern_match.group(1).split(" ", maxsplit=1)
         await self.settings.set(key, float(value))
+        if key.startswith("autochat."):
+            await self.autochat.reload()
         await event.edit(phrase.setting.setint.format(key=key, value=value))
 
     async def time_by_city(self, event: Message):
         city = event.pattern_match.group(1)
-        location = tz.geolocator.geocode(city)
-        if not location:
+        place = await tz.locate(city, await self.settings.get("token.geoapify"))
+        if not place:
             return await event.edit(phrase.time.not_found.format(city))
-        tz_name = await tz.get_timezone(
-            location.latitude,
-            location.longitude,
-            await self.settings.get("token.geoapify"),
-        )
+        tz_name = place["tz"]
         if not tz_name:
             return await event.edit(phrase.time.not_timezone.format(city))
         tzz = tz.pytz.timezone(tz_name)
         city_time = tz.datetime.now(tzz)
         await event.edit(
             phrase.time.location_info.format(
-                address=location.address,
+                address=place["address"],
                 time=city_time.strftime("%H:%M:%S"),
                 date=city_time.strftime("%d.%m.%Y"),
                 tz=tz_name,
@@ -976,12 +1020,19 @@ class UserbotManager:
             None,
         )
 
-        words = iterators.Counter()
+        index = wordfreq.WordIndex(
+            pathes.words / self.phone / f"{event.chat_id}.json"
+        )
+        await index.load()
+        batch: list[str] = []
+        pending: list[tuple[asyncio.Future, int, int]] = []
         total = 0
         dots = ""
         msg = await event.edit(phrase.words.all.format(words=total, dots=dots))
 
-        async for message in self.client.iter_messages(event.chat_id):
+        async for message in self.client.iter_messages(
+            event.chat_id, reverse=True, min_id=index.last_id, max_id=event.id
+        ):
             total += 1
             if total % 200 == 0:
                 dots = dots + "." if len(dots) < 3 else ""
@@ -994,23 +1045,30 @@ class UserbotManager:
                             phrase.words.except_all.format(total)
                         )
 
-            if message.text:
-                for word in message.text.split():
-                    clean = re.sub(r"\W+", "", word).strip()
-                    if clean and not clean.isdigit():
-                        if arg_len is None or len(clean) >= arg_len:
-                            words[clean.lower()] += 1
+            if message.raw_text:
+                batch.append(message.raw_text)
 
             if total % 1000 == 0:
+                pending.append((wordfreq.submit(batch), len(batch), message.id))
+                batch = []
+                if len(pending) >= 4 or total % 10000 == 0:
+                    for future, size, batch_id in pending:
+                        index.merge(await future, size, batch_id)
+                    pending = []
+                if total % 10000 == 0:
+                    await index.save()
                 await asyncio.sleep(await self.settings.get("typing.delay"))
 
-        freq = sorted(words, key=words.get, reverse=True)
+        if total:
+            pending.append((wordfreq.submit(batch), len(batch), event.id))
+            for future, size, batch_id in pending:
+                index.merge(await future, size, batch_id)
+            await index.save()
+
         out = phrase.words.out
-        maxsize = min(50, len(freq))
-        if arg_count is not None:
-            maxsize = min(arg_count, len(freq))
-        for i in range(maxsize):
-            out += f"{i + 1}. {words[freq[i]]}: {freq[i]}\n"
+        top = index.top(arg_count if arg_count is not None else 50, arg_len)
+        for i, (word, count) in enumerate(top):
+            out += f"{i + 1}. {count}: {word}\n"
 
         try:
             await msg.edit(out)
@@ -1056,6 +1114,8 @@ class UserbotManager:
         if not await self.settings.get("groq.token"):
             return await event.edit(phrase.ai.no_token)
         text = event.pattern_match.group(1).strip()
+        if await self.settings.get("ai.stream"):
+            return await self._ai_stream_resp(event, text)
         try:
             response = await self.ai_chat.send(text)
         except Exception as e:
@@ -1069,8 +1129,23 @@ class UserbotManager:
             await event.edit(response)
         return None
 
+    async def _ai_stream_resp(self, event: Message, text: str):
+        editor = d.StreamEditor(
+            event, interval=await self.settings.get("ai.stream_interval") / 1000
+        )
+        try:
+            async for delta in self.ai_chat.stream(text):
+                await editor.feed(delta)
+            await editor.finish()
+        except Exception as e:
+            return await editor.message.edit(phrase.error.format(e))
+        return None
+
     async def config_reload(self, event: Message):
         await self.settings._ensure_loaded(forced=True)
+        self.mask_read = set(await self.settings.get("mask.read") or [])
+        await self.flood_ctrl.reload()
+        await self.autochat.reload()
         await event.edit(phrase.config.reload)
 
     async def calc(self, event: Message):
@@ -1265,11 +1340,15 @@ async def main():
         save_config_func=_save_client_config,
     )
 
-    await asyncio.gather(
-        cli.run(),
-        *_manager_tasks.values(),
-        return_exceptions=True,
-    )
+    try:
+        await asyncio.gather(
+            cli.run(),
+            *_manager_tasks.values(),
+            return_exceptions=True,
+        )
+    finally:
+        wordfreq.shutdown()
+        await web.close()
     return None
 
 
@@ -1288,14 +1367,16 @@ if __name__ == "__main__":
         genpass,
         get_sys,
         ipman,
-        iterators,
         notes,
         pathes,
+        ratelimit,
         settings,
         task_gen,
         telemt,
         tz,
         vktarget_bot,
+        web,
+        wordfreq,
     )
 
     try:
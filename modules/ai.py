@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from collections import deque
+from collections.abc import AsyncIterator
 from pathlib import Path
 
 import aiofiles
@@ -8,10 +10,18 @@ from groq import AsyncGroq
 from httpx import AsyncClient
 from loguru import logger
 
-from . import pathes
+from . import iterators, pathes
 
 logger.info(f"Загружен модуль {__name__}!")
 
+_COMPACT_BYTES = 1 << 20
+_TAIL_BLOCK = 1 << 16
+
+
+def count_tokens(message: dict[str, str]) -> int:
+    "Грубая оценка токенов сообщения (~3 символа на токен + служебные)."
+    return len(message["content"]) // 3 + 4
+
 
 class GroqClient:
     def __init__(
@@ -21,11 +31,14 @@ class GroqClient:
         chats_dir: Path = pathes.ai,
         chat_model: str = "openai/gpt-oss-120b",
         voice_model: str = "whisper-large-v3-turbo",
+        history_tokens: int = 6000,
     ):
         self.api_key = api_key
         self.proxy = proxy
         self.chat_model = chat_model
         self.voice_model = voice_model
+        self.history_tokens = history_tokens
+        self.transcripts: iterators.LRU = iterators.LRU(256)
         self.chats_dir = chats_dir or Path(pathes.ai)
         self.chats_dir.mkdir(parents=True, exist_ok=True)
         self.client: AsyncGroq | None = None
@@ -52,64 +65,134 @@ class GroqClient:
             client=self.client,
             chats_dir=self.chats_dir,
             model=self.chat_model,
+            max_tokens=self.history_tokens,
         )
 
-    async def transcribe_voice(self, number: str, voice_id: str) -> str:
-        """Транскрибирует OGG-файл через Whisper."""
+    async def transcribe_voice(
+        self, audio: bytes, doc_id: int | None = None
+    ) -> str:
+        """Транскрибирует OGG из памяти через Whisper.
+
+        Результат кешируется по doc_id (id документа голосового сообщения).
+        """
         if self.client is None:
             raise RuntimeError("Groq client not initialized. Call init_client() first.")
-        voice_path = pathes.voice / number / f"voice_{voice_id}.ogg"
-        if not voice_path.exists():
-            raise FileNotFoundError(f"Voice file not found: {voice_path}")
-        async with aiofiles.open(voice_path, "rb") as f:
-            audio_data = await f.read()
-        try:
-            transcription = await self.client.audio.transcriptions.create(
-                file=("audio.ogg", audio_data),
-                model=self.voice_model,
-                temperature=0.0,
-                response_format="verbose_json",
-            )
-            return transcription.text.strip()
-        finally:
-            voice_path.unlink(missing_ok=True)
+        cached = self.transcripts.get(doc_id)
+        if cached is not None:
+            return cached
+        transcription = await self.client.audio.transcriptions.create(
+            file=("audio.ogg", audio),
+            model=self.voice_model,
+            temperature=0.0,
+            response_format="verbose_json",
+        )
+        text = transcription.text.strip()
+        if doc_id is not None:
+            self.transcripts[doc_id] = text
+        return text
 
 
 class GroqChatSession:
+    """Чат с ограниченным окном контекста.
+
+    В запрос уходят только последние сообщения, укладывающиеся в max_tokens.
+    Новые реплики дописываются в <chat_id>.jsonl, при загрузке читается
+    только хвост файла.
+    """
+
     def __init__(
         self,
         chat_id: str,
         client: AsyncGroq,
         chats_dir: Path,
         model: str,
+        max_tokens: int = 6000,
     ):
         self.chat_id = chat_id
         self.client = client
         self.model = model
-        self._path = chats_dir / f"{chat_id}.json"
-        self._history: list[dict[str, str]] = []
+        self.max_tokens = max_tokens
+        self._path = chats_dir / f"{chat_id}.jsonl"
+        self._legacy_path = chats_dir / f"{chat_id}.json"
+        self._history: deque[dict[str, str]] = deque()
+        self._tokens = 0
+        self._loaded = False
+
+    def _append(self, message: dict[str, str]) -> None:
+        self._history.append(message)
+        self._tokens += count_tokens(message)
+        while len(self._history) > 1 and (
+            self._tokens > self.max_tokens or self._history[0]["role"] != "user"
+        ):
+            self._tokens -= count_tokens(self._history.popleft())
 
     async def load(self) -> None:
+        self._history.clear()
+        self._tokens = 0
+        self._loaded = True
+        if not self._path.exists() and self._legacy_path.exists():
+            await self._migrate_legacy()
         if not self._path.exists():
-            self._history = []
             return
+        messages, size = await self._read_tail()
+        for message in messages:
+            self._append(message)
+        if size > _COMPACT_BYTES:
+            await self._rewrite(list(self._history))
+
+    async def _read_tail(self) -> tuple[list[dict[str, str]], int]:
+        "Читает файл с конца блоками, пока не наберётся окно."
+        messages: list[dict[str, str]] = []
+        tokens = 0
         async with aiofiles.open(self._path, "rb") as f:
+            size = pos = await f.seek(0, 2)
+            buf = b""
+            while pos > 0 and tokens < self.max_tokens:
+                step = min(_TAIL_BLOCK, pos)
+                pos -= step
+                await f.seek(pos)
+                lines = (await f.read(step) + buf).split(b"\n")
+                buf = lines.pop(0) if pos > 0 else b""
+                for line in reversed(lines):
+                    if not line.strip():
+                        continue
+                    try:
+                        message = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        continue
+                    messages.append(message)
+                    tokens += count_tokens(message)
+                    if tokens >= self.max_tokens:
+                        break
+        messages.reverse()
+        return messages, size
+
+    async def _migrate_legacy(self) -> None:
+        async with aiofiles.open(self._legacy_path, "rb") as f:
             content = await f.read()
-            self._history = orjson.loads(content) if content else []
-
-    async def _save(self) -> None:
-        data = orjson.dumps(self._history)
-        async with aiofiles.open(self._path, "wb") as f:
+        await self._rewrite(orjson.loads(content) if content else [])
+        self._legacy_path.unlink()
+
+    async def _rewrite(self, messages: list[dict[str, str]]) -> None:
+        tmp = self._path.with_suffix(".tmp")
+        async with aiofiles.open(tmp, "wb") as f:
+            await f.write(b"".join(orjson.dumps(m) + b"\n" for m in messages))
+        tmp.replace(self._path)
+
+    async def _save(self, *messages: dict[str, str]) -> None:
+        data = b"".join(orjson.dumps(m) + b"\n" for m in messages)
+        async with aiofiles.open(self._path, "ab") as f:
             await f.write(data)
 
     async def send(self, user_message: str) -> str:
-        if not self._history:
+        if not self._loaded:
             await self.load()
+        message = {"role": "user", "content": user_message}
         try:
-            self._history.append({"role": "user", "content": user_message})
+            self._append(message)
             response = await self.client.chat.completions.create(
                 model=self.model,
-                messages=self._history,
+                messages=list(self._history),
                 temperature=0.7,
                 # max_tokens=8192,
                 top_p=1.0,
@@ -118,15 +201,43 @@ class GroqChatSession:
         except Exception as e:
             ai_reply = f"[Ошибка Groq: {e}]"
         else:
-            self._history.append({"role": "assistant", "content": ai_reply})
-            await self._save()
+            reply = {"role": "assistant", "content": ai_reply}
+            self._append(reply)
+            await self._save(message, reply)
         return ai_reply
 
+    async def stream(self, user_message: str) -> AsyncIterator[str]:
+        "Как send, но отдаёт ответ кусками по мере генерации."
+        if not self._loaded:
+            await self.load()
+        message = {"role": "user", "content": user_message}
+        parts: list[str] = []
+        try:
+            self._append(message)
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=list(self._history),
+                temperature=0.7,
+                top_p=1.0,
+                stream=True,
+            )
+            async for chunk in response:
+                if chunk.choices and (delta := chunk.choices[0].delta.content):
+                    parts.append(delta)
+                    yield delta
+        except Exception as e:
+            yield f"[Ошибка Groq: {e}]"
+            return
+        reply = {"role": "assistant", "content": "".join(parts).strip()}
+        self._append(reply)
+        await self._save(message, reply)
+
     async def clear(self) -> None:
-        self._history = []
-        if self._path.exists():
-            self._path.unlink()
+        self._history.clear()
+        self._tokens = 0
+        self._path.unlink(missing_ok=True)
+        self._legacy_path.unlink(missing_ok=True)
 
     @property
     def history(self) -> list[dict[str, str]]:
-        return self._history.copy()
+        return list(self._history)
@@ -1,20 +1,60 @@
+import asyncio
+import time
+
 import aiohttp
 from loguru import logger
 
-from . import config, phrase
+from . import config, format, iterators, phrase, web
 
 logger.info(f"Загружен модуль {__name__}!")
 
+# base -> (время получения, таблица курсов относительно base)
+_rates: dict[str, tuple[float, dict[str, float]]] = {}
+_refreshing: dict[str, asyncio.Task] = {}
+
+# город -> (время получения, ответ OpenWeatherMap)
+_weather: iterators.LRU = iterators.LRU(512)
+_weather_inflight: dict[str, asyncio.Task] = {}
+weather_stats = iterators.Counter()
+
+
+def _cache_opt(name: str, default: float) -> float:
+    return (config.config.cache or {}).get(name, default)
+
+
+async def _fetch_weather(city: str, token: str) -> dict:
+    async with web.session().get(
+        config.config.url.openweathermap.format(city=city, apikey=token),
+        timeout=aiohttp.ClientTimeout(total=5),
+    ) as response:
+        return await response.json()
+
 
 async def get_weather(city, token=""):
+    """Погода с коротким кешем по нормализованному названию города.
+
+    Одновременные запросы одного города ждут один и тот же HTTP-запрос.
+    Счётчики hits/misses/coalesced - в weather_stats.
+    """
     if token == "":
         return phrase.weather.no_token
-    async with aiohttp.ClientSession() as session:
-        async with session.get(
-            config.config.url.openweathermap.format(city=city, apikey=token),
-            timeout=aiohttp.ClientTimeout(total=5),
-        ) as response:
-            data = await response.json()
+    key = format.normalize_city(city)
+    cached = _weather.get(key)
+    if cached and time.time() - cached[0] < _cache_opt("weather_ttl", 600):
+        weather_stats["hits"] += 1
+        data = cached[1]
+    else:
+        task = _weather_inflight.get(key)
+        if task is None:
+            weather_stats["misses"] += 1
+            task = asyncio.create_task(_fetch_weather(city, token))
+            _weather_inflight[key] = task
+            task.add_done_callback(lambda _: _weather_inflight.pop(key, None))
+        else:
+            weather_stats["coalesced"] += 1
+        data = await asyncio.shield(task)
+        if data.get("cod") == 200:
+            _weather[key] = (time.time(), data)
 
     if data.get("cod") != 200:
         return phrase.weather.no_city
@@ -28,24 +68,69 @@ async def get_weather(city, token=""):
     )
 
 
+async def _fetch_rates(base: str, token: str) -> dict[str, float] | None:
+    async with web.session().get(
+        config.config.url.exchangerate.format(token=token, currency=base)
+    ) as resp:
+        data: dict = await resp.json()
+    if data.get("result", None) != "success":
+        return None
+    _rates[base] = (time.time(), data["conversion_rates"])
+    return data["conversion_rates"]
+
+
+async def _refresh(base: str, token: str) -> None:
+    try:
+        await _fetch_rates(base, token)
+    except Exception:
+        logger.trace(f"Не удалось обновить курсы {base}")
+    finally:
+        _refreshing.pop(base, None)
+
+
+def _cached_rate(currency: str, target: str) -> tuple[float, str, float] | None:
+    """Курс currency -> target из любой закешированной таблицы.
+
+    Возвращает (курс, база, возраст таблицы); свежие таблицы в приоритете.
+    """
+    best = None
+    now = time.time()
+    for base in (currency, target, *_rates):
+        if base not in _rates:
+            continue
+        fetched, rates = _rates[base]
+        if currency in rates and target in rates and rates[currency]:
+            age = now - fetched
+            if best is None or age < best[2]:
+                best = (rates[target] / rates[currency], base, age)
+    return best
+
+
 async def conv_currency(
     currency: str, count: int = 1, default_type: str = "RUB", token: str = ""
 ) -> str:
+    """Конвертация по кешу курсов.
+
+    Любая пара считается через кросс-курс из одной таблицы. Таблица старше
+    cache.rates_ttl ещё отдаётся (до cache.rates_stale), но обновляется в фоне.
+    """
     currency = currency.upper()
     default_type = default_type.upper()
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(
-            config.config.url.exchangerate.format(token=token, currency=currency)
-        ) as resp:
-            data: dict = await resp.json()
-
-    if data.get("result", None) != "success":
-        return phrase.currency.error
-    if default_type not in data["conversion_rates"]:
-        return phrase.currency.no_currency.format(default_type)
+    cached = _cached_rate(currency, default_type)
+    if cached is not None and cached[2] < _cache_opt("rates_stale", 86400):
+        rate, base, age = cached
+        if age >= _cache_opt("rates_ttl", 3600) and base not in _refreshing:
+            _refreshing[base] = asyncio.create_task(_refresh(base, token))
+    else:
+        rates = await _fetch_rates(currency, token)
+        if rates is None:
+            return phrase.currency.error
+        if default_type not in rates:
+            return phrase.currency.no_currency.format(default_type)
+        rate = rates[default_type]
 
-    result = round(data["conversion_rates"][default_type] * count, 2)
+    result = round(rate * count, 2)
     return phrase.currency.done.format(
         count1=count, cur1=currency, count2=result, cur2=default_type
     )
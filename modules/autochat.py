@@ -1,71 +1,242 @@
 import asyncio
+import contextlib
 import random
+import time
 
+import aiofiles
+import aiofiles.os
+import orjson
 from loguru import logger
-from telethon import TelegramClient
+from telethon import TelegramClient, errors, utils
 from telethon.tl.custom import Message
+from telethon.tl.functions.messages import ForwardMessagesRequest
+from telethon.tl.types import TypeInputPeer
 
-from . import phrase, settings
+from . import pathes, phrase, ratelimit, settings
 
 logger.info(f"Загружен модуль {__name__}!")
 
+MODES = ("spread", "burst")
+INVALID_PEER = (
+    errors.PeerIdInvalidError,
+    errors.ChannelInvalidError,
+    errors.ChatIdInvalidError,
+)
+
+
+def _chat_ref(value):
+    "id чата числом, если это число, иначе как есть (username)."
+    with contextlib.suppress(TypeError, ValueError):
+        return int(value)
+    return value
+
 
 class AutoChatManager:
-    def __init__(self, client: TelegramClient, settings: "settings.UBSettings"):
+    """Автопостинг рекламы в чаты.
+
+    Каждый чат получает пост раз в delay * число_чатов секунд. Режим
+    autochat.mode: spread - по одному чату не чаще раза в delay секунд,
+    burst - все подошедшие чаты сразу (темп держит governor). Время последней
+    отправки по чатам хранится в журнале, поэтому перезапуск не сбивает
+    очередь и не даёт дублей.
+
+    InputPeer источника и целевых чатов резолвятся один раз после изменения
+    настроек; пересылка идёт готовым ForwardMessagesRequest. При ошибке
+    неверного peer он перезапрашивается мимо кеша сессии: сначала цель,
+    и только если не помогло - источник.
+    """
+
+    def __init__(
+        self,
+        client: TelegramClient,
+        settings: "settings.UBSettings",
+        governor: "ratelimit.Governor",
+    ):
         self.client = client
         self.settings = settings
+        self.governor = governor
+        self.journal_path = pathes.autochat / settings.filename.name
+        self._journal: dict[int, float] = {}
         self._running = False
         self._task: asyncio.Task | None = None
+        self._wake = asyncio.Event()
+        self._next_slot = 0.0
+        self._peers: dict[int, TypeInputPeer] = {}
+        self._ad_peer: TypeInputPeer | None = None
+        self._stale = True
+        self._resolve_lock = asyncio.Lock()
+        self.chats: list[int] = []
+        self.ad_chat = None
+        self.ad_id = None
+        self.delay = 3600
+        self.mode = "spread"
 
     async def start(self):
         if self._running:
             return
         self._running = True
+        await self._load_journal()
+        await self.reload()
         self._task = asyncio.create_task(self._worker())
 
     async def stop(self):
         self._running = False
+        self._wake.set()
         if self._task:
             await self._task
             self._task = None
+        await self._save_journal()
 
+    async def reload(self):
+        "Перечитывает настройки и будит воркер."
+        # .set сохраняет строки, поэтому значения приводятся к нужным типам.
+        self.chats = [int(c) for c in await self.settings.get("autochat.chats", [])]
+        ad_chat = _chat_ref(await self.settings.get("autochat.ad_chat"))
+        if ad_chat != self.ad_chat:
+            self._ad_peer = None
+        self.ad_chat = ad_chat
+        ad_id = await self.settings.get("autochat.ad_id")
+        self.ad_id = int(ad_id) if ad_id else None
+        self.delay = float(await self.settings.get("autochat.delay", 1000))
+        self.mode = str(await self.settings.get("autochat.mode", "spread")).lower()
+        self._stale = True
+        self._wake.set()
 
-    async def _worker(self):
-        "Воркер авточата."
-        current_chats = []
+    async def _input_peer(self, chat_id: int) -> TypeInputPeer | None:
+        try:
+            return await self.governor.call(self.client.get_input_entity, chat_id)
+        except Exception:
+            logger.warning(f"Автопост: не удалось найти чат {chat_id}")
+            return None
 
-        while self._running:
-            chat_ids = await self.settings.get("autochat.chats", [])
-            ad_chat = await self.settings.get("autochat.ad_chat")
-            ad_id = await self.settings.get("autochat.ad_id")
-            delay = await self.settings.get("autochat.delay", 1000)
+    async def _resolve_peers(self):
+        "Дорезолвивает недостающие InputPeer и выкидывает удалённые чаты."
+        async with self._resolve_lock:
+            self._stale = False
+            if self._ad_peer is None:
+                self._ad_peer = await self._input_peer(self.ad_chat)
+            for chat_id in set(self._peers) - set(self.chats):
+                del self._peers[chat_id]
+            for chat_id in self.chats:
+                if chat_id not in self._peers:
+                    if (peer := await self._input_peer(chat_id)) is not None:
+                        self._peers[chat_id] = peer
+
+    async def _fresh_peer(self, chat) -> TypeInputPeer | None:
+        "InputPeer с актуальным access_hash: из списка диалогов, а не из кеша."
+        if not isinstance(chat, int):
+            return utils.get_input_peer(await self.client.get_entity(chat))
+        async for dialog in self.client.iter_dialogs():
+            if dialog.id == chat:
+                return utils.get_input_peer(dialog.entity)
+        logger.warning(f"Автопост: чат {chat} не найден среди диалогов")
+        return None
 
-            if not (chat_ids and ad_chat and ad_id):
-                await asyncio.sleep(60)
-                continue
+    async def _refresh_target(self, chat_id: int):
+        if (peer := await self._fresh_peer(chat_id)) is not None:
+            self._peers[chat_id] = peer
+        else:
+            self._peers.pop(chat_id, None)
+
+    async def _load_journal(self):
+        if not self.journal_path.exists():
+            return
+        async with aiofiles.open(self.journal_path, "rb") as f:
+            data = orjson.loads(await f.read())
+        self._journal = {int(chat): ts for chat, ts in data.items()}
 
-            if not current_chats:
-                current_chats = chat_ids.copy()
+    async def _save_journal(self):
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        content = orjson.dumps({str(chat): ts for chat, ts in self._journal.items()})
+        tmp = self.journal_path.with_name(f"{self.journal_path.name}.tmp")
+        async with aiofiles.open(tmp, "wb") as f:
+            await f.write(content)
+        await aiofiles.os.replace(tmp, self.journal_path)
 
-                logger.info(
-                    f"Автопост: доступно чатов - {len(current_chats)}"
-                )
+    async def _wait(self, seconds: float | None):
+        with contextlib.suppress(TimeoutError):
+            async with asyncio.timeout(seconds):
+                await self._wake.wait()
+        self._wake.clear()
 
-            random_index = random.randrange(len(current_chats))
-            chat_id = current_chats.pop(random_index)
+    def _due(self, now: float) -> tuple[list[int], float]:
+        "Чаты, которым пора отправить, и время, когда подойдёт следующий."
+        period = self.delay * len(self.chats)
+        due = []
+        next_due = float("inf")
+        for chat_id in self.chats:
+            at = self._journal.get(chat_id, 0.0) + period
+            if at <= now:
+                due.append(chat_id)
+            else:
+                next_due = min(next_due, at)
+        return due, next_due
 
+    async def _forward(self, chat_id: int):
+        if chat_id not in self._peers or self._ad_peer is None:
+            await self._resolve_peers()
+        peer = self._peers.get(chat_id)
+        if peer is None or self._ad_peer is None:
+            raise ValueError(f"Не найден peer для {chat_id}")
+        await self.governor.request(
+            self.client,
+            ForwardMessagesRequest(
+                from_peer=self._ad_peer,
+                id=[self.ad_id],
+                to_peer=peer,
+                random_id=[random.randrange(-(2**63), 2**63)],
+            ),
+        )
+
+    async def _send(self, chat_id: int):
+        self._journal[chat_id] = time.time()
+        try:
+            try:
+                await self._forward(chat_id)
+            except INVALID_PEER:
+                await self._refresh_target(chat_id)
+                try:
+                    await self._forward(chat_id)
+                except INVALID_PEER:
+                    self._ad_peer = await self._fresh_peer(self.ad_chat)
+                    await self._forward(chat_id)
+            logger.info(f"Автопост: сообщение отправлено в {chat_id}")
+        except Exception:
+            logger.exception(f"Автопост: ошибка при отправке в {chat_id}")
+
+    async def _worker(self):
+        "Воркер авточата."
+        while self._running:
             try:
-                await self.client.forward_messages(chat_id, int(ad_id), ad_chat)
-                logger.info(
-                    f"Автопост: сообщение отправлено в {chat_id} (ост.: {len(current_chats)})"
-                )
+                await self._step()
             except Exception:
-                logger.exception(f"Автопост: ошибка при отправке в {chat_id}")
+                logger.exception("Автопост: ошибка в воркере")
+                await self._wait(60)
 
-            for _ in range(delay):
-                if not self._running:
-                    return
-                await asyncio.sleep(1)
+    async def _step(self):
+        if not (self.chats and self.ad_chat and self.ad_id):
+            await self._wait(None)
+            return
+        if self._stale:
+            await self._resolve_peers()
+
+        now = time.time()
+        due, next_due = self._due(now)
+        if due and self.mode == "burst":
+            logger.info(f"Автопост: рассылка в {len(due)} чатов")
+            await asyncio.gather(*(self._send(chat_id) for chat_id in due))
+            await self._save_journal()
+            return
+        if due and now >= self._next_slot:
+            random.shuffle(due)
+            chat_id = min(due, key=lambda c: self._journal.get(c, 0.0))
+            await self._send(chat_id)
+            await self._save_journal()
+            self._next_slot = time.time() + self.delay
+            return
+
+        wake_at = self._next_slot if due else next_due
+        await self._wait(max(0.0, wake_at - time.time()))
 
     async def toggle(self, event: Message):
         enabled = not await self.settings.get("autochat.enabled", False)
@@ -86,6 +257,7 @@ class AutoChatManager:
         if chat_id not in chats:
             chats.append(chat_id)
             await self.settings.set("autochat.chats", chats)
+            await self.reload()
         await event.edit(phrase.autochat.added.format(chat_id))
         return None
 
@@ -98,6 +270,7 @@ class AutoChatManager:
         if chat_id in chats:
             chats.remove(chat_id)
             await self.settings.set("autochat.chats", chats)
+            await self.reload()
         await event.edit(phrase.autochat.removed.format(chat_id))
         return None
 
@@ -109,5 +282,15 @@ class AutoChatManager:
         except (ValueError, TypeError):
             return await event.edit(phrase.autochat.invalid_time)
         await self.settings.set("autochat.delay", delay)
+        await self.reload()
         await event.edit(phrase.autochat.time_set.format(delay))
         return None
+
+    async def set_mode(self, event: Message):
+        mode = event.pattern_match.group(1).lower()
+        if mode not in MODES:
+            return await event.edit(phrase.autochat.invalid_mode)
+        await self.settings.set("autochat.mode", mode)
+        await self.reload()
+        await event.edit(phrase.autochat.mode_set.format(mode))
+        return None
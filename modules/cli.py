@@ -2,6 +2,7 @@ import asyncio
 import readline
 import sys
 import threading
+import time
 
 _PROMPT = "> "
 _HELP = """\
@@ -10,6 +11,9 @@ ping          - Проверка CLI
 addclient     - Добавить клиента (интерактивно)
 stop <phone>  - Остановить клиента по номеру телефона
 stopall       - Остановить всех клиентов
+cmdstats <phone> - Счётчики команд клиента
+jobs          - Задачи планировщика (след. запуск, задержка)
+flood <phone> - Темп и FloodWait по методам Telegram клиента
 exit / quit   - Выход
 help / ?      - Показать эту справку"""
 
@@ -99,6 +103,51 @@ class CLI:
                 task.cancel()
         self._print(f"Stopped {len(phones)} client(s).")
 
+    async def _cmd_cmdstats(self, phone: str):
+        manager = self._managers.get(phone)
+        if not manager:
+            self._print(f"No such client: {phone}")
+            return
+        stats = sorted(manager.router.stats().items(), key=lambda i: -i[1][0])
+        self._print(
+            "Command stats (matched/dispatched):\n"
+            + "\n".join(f"  {m}/{d}  {p}" for p, (m, d) in stats if m)
+        )
+
+    async def _cmd_flood(self, phone: str):
+        manager = self._managers.get(phone)
+        if not manager:
+            self._print(f"No such client: {phone}")
+            return
+        state = manager.governor.state()
+        if not state:
+            self._print("No governed calls yet.")
+            return
+        self._print(
+            "Governor (rate / backoff / last FloodWait):\n"
+            + "\n".join(
+                f"  {method}: {rate:.2f}/s / {backoff:.0f}s / {last:.0f}s"
+                for method, (rate, backoff, last) in sorted(state.items())
+            )
+        )
+
+    async def _cmd_jobs(self):
+        from . import task_gen
+
+        jobs = task_gen.scheduler.jobs()
+        if not jobs:
+            self._print("No scheduled jobs.")
+            return
+        now = time.time()
+        self._print(
+            "Jobs (next run / lag / max lag):\n"
+            + "\n".join(
+                f"  {j.key}: {max(0.0, j.next_run - now):.0f}s / {j.lag:.2f}s"
+                f" / {j.max_lag:.2f}s{' [paused]' if j.paused else ''}"
+                for j in jobs
+            )
+        )
+
     async def _dispatch(self, line: str) -> bool:
         parts = line.strip().split(maxsplit=1)
         if not parts:
@@ -116,6 +165,12 @@ class CLI:
                 await self._cmd_stop(arg)
             case "stopall":
                 await self._cmd_stopall()
+            case "cmdstats":
+                await self._cmd_cmdstats(arg)
+            case "jobs":
+                await self._cmd_jobs()
+            case "flood":
+                await self._cmd_flood(arg)
             case "exit" | "quit":
                 await self._cmd_stopall()
                 self._print("Пока.")
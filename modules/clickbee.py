@@ -9,7 +9,7 @@ from telethon.tl.custom import Message
 from telethon.tl.functions.channels import JoinChannelRequest
 from telethon.tl.functions.messages import ImportChatInviteRequest
 
-from . import settings
+from . import ratelimit, settings
 
 logger.info(f"Загружен модуль {__name__}!")
 TASK_BUTTONS = ["🤖 Join Bots", "📢 Join Channels", "📄 View Posts"]
@@ -43,10 +43,14 @@ class ClickBeeAutomation:
     """Авто-заработок на ClickBee-ботах."""
 
     def __init__(
-        self, client: TelegramClient, user_settings: "settings.UBSettings"
+        self,
+        client: TelegramClient,
+        user_settings: "settings.UBSettings",
+        governor: "ratelimit.Governor",
     ) -> None:
         self.client = client
         self.settings = user_settings
+        self.governor = governor
         self._active = False
         self._lock = asyncio.Lock()
         self._handler = None
@@ -63,7 +67,7 @@ class ClickBeeAutomation:
         self._register_handler()
         logger.info("ClickBee запущен")
         await asyncio.sleep(random.uniform(1.5, 3))
-        await self.client.send_message(self.bot, self._task_iter.next())
+        await self._send(self._task_iter.next())
 
     def stop(self) -> None:
         self._active = False
@@ -71,6 +75,9 @@ class ClickBeeAutomation:
         self._browser = None
         logger.info("ClickBee остановлен")
 
+    async def _send(self, text: str) -> None:
+        await self.governor.call(self.client.send_message, self.bot, text)
+
     async def toggle(self, event: Message) -> None:
         enabled = not await self.settings.get("clickbee.enabled", False)
         await self.settings.set("clickbee.enabled", enabled)
@@ -112,7 +119,7 @@ class ClickBeeAutomation:
         if not self._active:
             return None
         text = event.text or ""
-        await event.mark_read()
+        await self.governor.call(event.mark_read)
         await asyncio.sleep(random.uniform(1.5, 4))
         handlers = [
             ("You've earned", self._handle_earned),
@@ -152,9 +159,8 @@ class ClickBeeAutomation:
         if self._task_iter.cycle_complete:
             await self._switch_bot(event)
         else:
-            task = self._task_iter.next()
             await asyncio.sleep(random.uniform(1, 2))
-            await event.respond(task)
+            await self._send(self._task_iter.next())
 
     async def _handle_forward_check(self, event: Message) -> None:
         """Нажимаем кнопку ✅ для подтверждения пересылки."""
@@ -181,7 +187,8 @@ class ClickBeeAutomation:
                     response = await asyncio.wait_for(
                         conv.get_response(), timeout=BOT_CONVERSATION_TIMEOUT
                     )
-                    await self.client.forward_messages(
+                    await self.governor.call(
+                        self.client.forward_messages,
                         entity=event.sender_id,
                         messages=response.id,
                         from_peer=response.sender_id,
@@ -233,8 +240,7 @@ class ClickBeeAutomation:
             )
             return await self._next_task(event)
         await asyncio.sleep(random.uniform(5, 10))
-        current = self._task_iter.current()
-        await event.respond(current)
+        await self._send(self._task_iter.current())
         return None
 
     async def _handle_new_task(self, event: Message) -> None:
@@ -244,9 +250,8 @@ class ClickBeeAutomation:
     async def _next_task(self, event: Message) -> None:
         if not self._active:
             return
-        task = self._task_iter.next()
         await asyncio.sleep(random.uniform(1, 3))
-        await event.respond(task)
+        await self._send(self._task_iter.next())
 
     async def _switch_bot(self, event: Message) -> None:
         if not self._active:
@@ -259,15 +264,14 @@ class ClickBeeAutomation:
         await asyncio.sleep(actual_sleep)
         if not self._active:
             return
-        first_task = self._task_iter.next()
-        await self.client.send_message(self.bot, first_task)
+        await self._send(self._task_iter.next())
 
     async def _skip_or_back(self, event: Message) -> None:
         """Нажимает Skip или Back, если есть."""
         for label in ("Skip", "🔙 Back", "Back"):
             if await self._click_button(event, label):
                 return
-        await event.respond("🔙 Back")
+        await self._send("🔙 Back")
 
     async def _click_button_or_next(self, event: Message) -> None:
         for label in ("Next", "➡️", "✅", "Skip"):
@@ -278,7 +282,7 @@ class ClickBeeAutomation:
     async def _join_channel_safe(self, link: str) -> bool:
         """Пробует вступить публично, затем по инвайту."""
         try:
-            await self.client(JoinChannelRequest(link))
+            await self.governor.request(self.client, JoinChannelRequest(link))
             logger.info(f"ClickBee: Вступил в {link}")
             return True
         except Exception:
@@ -287,7 +291,9 @@ class ClickBeeAutomation:
         if hash_match:
             hash_part = hash_match.group(1)
             try:
-                await self.client(ImportChatInviteRequest(hash_part))
+                await self.governor.request(
+                    self.client, ImportChatInviteRequest(hash_part)
+                )
                 logger.info(f"ClickBee: Вступил по инвайту {hash_part}")
                 return True
             except Exception as exc:
@@ -304,15 +310,14 @@ class ClickBeeAutomation:
                     return getattr(button, "url", None)
         return None
 
-    @staticmethod
-    async def _click_button(event: Message, text_fragment: str) -> bool:
+    async def _click_button(self, event: Message, text_fragment: str) -> bool:
         if not event.reply_markup:
             return False
         for row in event.reply_markup.rows:
             for button in row.buttons:
                 if text_fragment in (button.text or ""):
                     with suppress(Exception):
-                        await event.click(text=button.text)
+                        await self.governor.call(event.click, text=button.text)
                         return True
         return False
 
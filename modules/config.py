@@ -16,6 +16,21 @@ _default_config = {
         "fp": "https://api.proxyscrape.com/v4/free-proxy-list/get?request=display_proxies&proxy_format=protocolipport&format=text",
         "exchangerate": "https://v6.exchangerate-api.com/v6/{token}/latest/{currency}",
     },
+    "http": {"timeout": 10, "limit": 100, "limit_per_host": 10, "dns_ttl": 300},
+    "cache": {"rates_ttl": 3600, "rates_stale": 86400, "weather_ttl": 600},
+    "proxy_check": {
+        "mode": "handshake",
+        "target": "1.1.1.1:443",
+        "verify": True,
+        "concurrency": 100,
+    },
+    "governor": {
+        "rate": 3,
+        "max_rate": 20,
+        "burst": 3,
+        "max_wait": 60,
+        "read_ack": 0.5,
+    },
     "battery_path": "/sys/class/power_supply/battery/status",
     "wait_delete": 60,
     "use_ipv6": False,
@@ -1,10 +1,19 @@
+import asyncio
+import re
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
 from loguru import logger
-from telethon import TelegramClient, events
+from telethon import TelegramClient, errors, events
 from telethon.tl.functions.users import GetFullUserRequest
 from telethon.tl.types.users import UserFull
 
 logger.info(f"Загружен модуль {__name__}!")
 
+PREFIXES = ".+-!"
+_META = set(".^$*+?{}[]|()")
+
 
 def cmd(pattern, *, incoming=False, outgoing=True, **kwargs) -> events.NewMessage:
     "Wrapper for events.NewMessage"
@@ -17,6 +26,176 @@ def cmd(pattern, *, incoming=False, outgoing=True, **kwargs) -> events.NewMessag
     )
 
 
+def literal_head(pattern: str) -> str:
+    "Литеральное начало regex-паттерна команды (до первого метасимвола)."
+    depth = 0
+    escaped = False
+    for c in pattern:
+        if escaped:
+            escaped = False
+        elif c == "\\":
+            escaped = True
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == "|" and depth == 0:
+            return ""
+
+    head = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            if i + 1 >= len(pattern) or pattern[i + 1].isalnum():
+                break
+            char, i = pattern[i + 1], i + 2
+        elif c in _META:
+            break
+        else:
+            char, i = c, i + 1
+        if i < len(pattern) and pattern[i] in "?*{":
+            break
+        head.append(char)
+    return "".join(head).lower()
+
+
+@dataclass
+class Command:
+    pattern: str
+    handler: Callable[..., Awaitable]
+    regex: re.Pattern = field(init=False)
+    matched: int = 0
+    dispatched: int = 0
+
+    def __post_init__(self) -> None:
+        self.regex = re.compile(rf"(?i)^{self.pattern}")
+
+
+class _Node:
+    __slots__ = ("children", "commands")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _Node] = {}
+        self.commands: list[Command] = []
+
+
+class Router:
+    """Единый обработчик команд вместо отдельного NewMessage на каждый regex.
+
+    Команды индексируются в префиксном дереве по литеральному началу паттерна,
+    поэтому поиск кандидатов стоит O(длины префикса), а полный regex
+    проверяется только у них (от самого длинного префикса к короткому).
+    """
+
+    def __init__(self) -> None:
+        self._root = _Node()
+        self._commands: list[Command] = []
+
+    def on(self, pattern: str) -> Callable:
+        "Декоратор в стиле client.on(d.cmd(...))."
+
+        def decorator(handler: Callable[..., Awaitable]) -> Callable:
+            self.add(pattern, handler)
+            return handler
+
+        return decorator
+
+    def add(self, pattern: str, handler: Callable[..., Awaitable]) -> Command:
+        head = literal_head(pattern)
+        if not head or head[0] not in PREFIXES:
+            raise ValueError(f"Команда должна начинаться с префикса: {pattern!r}")
+        node = self._root
+        for char in head:
+            node = node.children.setdefault(char, _Node())
+        command = Command(pattern, handler)
+        node.commands.append(command)
+        self._commands.append(command)
+        return command
+
+    def resolve(self, text: str) -> tuple[Command, re.Match] | None:
+        node = self._root
+        path: list[_Node] = []
+        for char in text:
+            node = node.children.get(char.lower())
+            if node is None:
+                break
+            if node.commands:
+                path.append(node)
+        for node in reversed(path):
+            for command in node.commands:
+                if match := command.regex.match(text):
+                    command.matched += 1
+                    return command, match
+        return None
+
+    def builder(self) -> events.NewMessage:
+        return events.NewMessage(incoming=False, outgoing=True)
+
+    async def dispatch(self, event) -> None:
+        text = event.message.message or ""
+        if not text or text[0] not in PREFIXES:
+            return
+        resolved = self.resolve(text)
+        if resolved is None:
+            return
+        command, event.pattern_match = resolved
+        await command.handler(event)
+        command.dispatched += 1
+
+    def stats(self) -> dict[str, tuple[int, int]]:
+        "Счётчики {паттерн: (совпадений, успешных вызовов)}."
+        return {c.pattern: (c.matched, c.dispatched) for c in self._commands}
+
+
+class StreamEditor:
+    """Постепенно редактирует сообщение по мере поступления текста.
+
+    Правки идут не чаще раза в interval секунд; при переполнении limit
+    сообщение фиксируется и текст продолжается в новом ответе.
+    """
+
+    def __init__(self, message, interval: float = 0.7, limit: int = 4096) -> None:
+        self.message = message
+        self.interval = interval
+        self.limit = limit
+        self._text = ""
+        self._shown = ""
+        self._next_edit = 0.0
+
+    async def feed(self, delta: str) -> None:
+        self._text += delta
+        # Хвост из одних пробелов копится, пока не придёт текст, а пробелы в
+        # начале нового сообщения отбрасываются: пустой ответ Telegram не примет.
+        while len(self._text) > self.limit and self._text[self.limit :].strip():
+            head = self._text[: self.limit]
+            self._text = self._text[self.limit :].lstrip()
+            await self._edit(head, force=True)
+            self._shown = self._text[: self.limit]
+            self.message = await self.message.reply(self._shown)
+        if time.monotonic() >= self._next_edit:
+            await self._edit(self._text[: self.limit])
+
+    async def finish(self) -> None:
+        await self._edit(self._text[: self.limit], force=True)
+
+    async def _edit(self, text: str, force: bool = False) -> None:
+        if not text.strip() or text == self._shown:
+            return
+        try:
+            await self.message.edit(text)
+        except errors.MessageNotModifiedError:
+            pass
+        except errors.FloodWaitError as e:
+            if not force:
+                self._next_edit = time.monotonic() + e.seconds
+                return
+            await asyncio.sleep(e.seconds)
+            await self.message.edit(text)
+        self._shown = text
+        self._next_edit = time.monotonic() + self.interval
+
+
 async def get_info(client: TelegramClient, str: str, return_str=False) -> int | list:
     if str[-1] == ",":
         str = str[:-1]
@@ -1,4 +1,6 @@
 import time
+from array import array
+from collections import OrderedDict
 
 from loguru import logger
 from telethon import TelegramClient
@@ -14,13 +16,62 @@ from . import phrase, settings
 
 logger.info(f"Загружен модуль {__name__}!")
 
+MAX_SENDERS = 512
+RULE_TYPES = ("stickers", "gifs", "messages")
+
+
+class _Window:
+    """Скользящее окно на кольцевом буфере из limit меток времени.
+
+    В ячейке под курсором лежит метка сообщения, отправленного limit
+    сообщений назад: если она моложе окна, текущее сообщение - лишнее.
+    """
+
+    __slots__ = ("times", "pos", "cleared", "last")
+
+    def __init__(self, limit: int) -> None:
+        self.times = array("d", bytes(8 * limit))
+        self.pos = 0
+        self.cleared = 0.0
+        self.last = 0.0
+
+    def hit(self, now: float, window: float) -> bool:
+        oldest = self.times[self.pos]
+        self.times[self.pos] = now
+        self.pos = (self.pos + 1) % len(self.times)
+        self.last = now
+        if oldest > now - window and oldest > self.cleared:
+            self.cleared = now
+            return True
+        return False
+
 
 class FloodController:
     def __init__(self, client: "TelegramClient", settings: "settings.UBSettings"):
         self.client = client
         self.settings = settings
-        self._flood_state: dict[str, list[float]] = {}
+        self._flood_state: dict[tuple[int, str], OrderedDict[int, _Window]] = {}
         self._flood_rules: dict[int, dict[str, dict]] = {}
+        self.chats: set[int] = set()
+
+    async def load(self):
+        "Загружает все правила заранее, чтобы префильтр знал чаты с ними."
+        for key in await self.settings.keys("flood."):
+            parts = key.split(".")
+            if len(parts) == 3 and parts[1] in RULE_TYPES:
+                await self.load_rules(int(parts[2]))
+
+    async def reload(self):
+        "Перечитывает правила после перезагрузки настроек."
+        self._flood_rules.clear()
+        self.chats.clear()
+        await self.load()
+
+    def _update_chat(self, chat_id: int):
+        if any(self._flood_rules[chat_id].values()):
+            self.chats.add(chat_id)
+        else:
+            self.chats.discard(chat_id)
 
     async def load_rules(self, chat_id: int):
         if chat_id not in self._flood_rules:
@@ -32,6 +83,7 @@ class FloodController:
                 "gifs": gifs,
                 "messages": messages,
             }
+            self._update_chat(chat_id)
 
     async def monitor(self, event: Message):
         if event.is_private or not event.sender_id:
@@ -39,7 +91,7 @@ class FloodController:
         chat_id = event.chat_id
         await self.load_rules(chat_id)
         rules = self._flood_rules[chat_id]
-        now = time.time()
+        now = time.monotonic()
 
         if rules["stickers"] and isinstance(event.media, MessageMediaDocument):
             doc = event.media.document
@@ -65,20 +117,24 @@ class FloodController:
         window = rule.get("window", 0)
         if limit <= 0 or window <= 0:
             return
-        key = f"_flood.{flood_type}.{chat_id}.{event.sender_id}"
-        timestamps = self._flood_state.get(key, [])
-        cutoff = now - window
-        timestamps = [ts for ts in timestamps if ts > cutoff]
-        timestamps.append(now)
-        if len(timestamps) > limit:
+        senders = self._flood_state.setdefault((chat_id, flood_type), OrderedDict())
+        while senders:
+            oldest = next(iter(senders.values()))
+            if oldest.last > now - window and len(senders) < MAX_SENDERS:
+                break
+            senders.popitem(last=False)
+
+        state = senders.pop(event.sender_id, None)
+        if state is None or len(state.times) != limit:
+            state = _Window(limit)
+        senders[event.sender_id] = state
+        if state.hit(now, window):
             try:
                 msg = await self.settings.get("flood.msg")
                 if msg:
                     await event.reply(msg)
             except Exception:
                 pass
-            timestamps = []
-        self._flood_state[key] = timestamps
 
     async def set_rule(self, event: Message, rule_type: str):
         try:
@@ -89,9 +145,9 @@ class FloodController:
         chat_id = event.chat_id
         key = f"flood.{rule_type}.{chat_id}"
         await self.settings.set(key, {"limit": limit, "window": window})
-        if chat_id not in self._flood_rules:
-            self._flood_rules[chat_id] = {}
+        await self.load_rules(chat_id)
         self._flood_rules[chat_id][rule_type] = {"limit": limit, "window": window}
+        self._update_chat(chat_id)
 
         phrase_map = {
             "stickers": phrase.flood.set_stickers,
@@ -107,10 +163,8 @@ class FloodController:
         await self.settings.remove(key)
         if chat_id in self._flood_rules:
             self._flood_rules[chat_id][rule_type] = {}
-        prefix = f"_flood.{rule_type}.{chat_id}."
-        to_remove = [k for k in self._flood_state if k.startswith(prefix)]
-        for k in to_remove:
-            self._flood_state.pop(k, None)
+            self._update_chat(chat_id)
+        self._flood_state.pop((chat_id, rule_type), None)
 
         phrase_map = {
             "stickers": phrase.flood.unset_stickers,
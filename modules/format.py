@@ -90,6 +90,10 @@ def normalize_currency(value: str) -> str | None:
     return _NAMES.get(value.strip().lower(), value)
 
 
+def normalize_city(city: str) -> str:
+    return " ".join(city.casefold().replace("ё", "е").split())
+
+
 def f2vk(text: str) -> str:
     if not text:
         text = ""
@@ -1,13 +1,19 @@
 import asyncio
+import contextlib
+import ipaddress
 import random
 import re
 import time
+from collections.abc import AsyncIterator
 
+import aiofiles
+import aiofiles.os
 import aiohttp
+import orjson
 from aiohttp_socks import ProxyConnector, ProxyType
 from loguru import logger
 
-from . import config
+from . import config, pathes, web
 
 logger.info(f"Загружен модуль {__name__}!")
 
@@ -51,22 +57,24 @@ async def get_ip_info(ip: str) -> dict:
     }
     """
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"http://ip-api.com/json/{ip}",
-                params={"lang": "ru"},
-                timeout=aiohttp.ClientTimeout(total=5),
-            ) as response:
-                response.raise_for_status()
-                return await response.json()
+        async with web.session().get(
+            f"http://ip-api.com/json/{ip}",
+            params={"lang": "ru"},
+            timeout=aiohttp.ClientTimeout(total=5),
+        ) as response:
+            response.raise_for_status()
+            return await response.json()
     except Exception:
         logger.trace("Ошибка при получении информации об IP")
 
 
-async def check_proxy_ping(proxy_type: str, ipport: str) -> float | None:
+async def check_proxy_ping(
+    proxy_type: str, ipport: str, session: aiohttp.ClientSession | None = None
+) -> float | None:
     """
     Возвращает пинг в мс (float), если прокси жив.
     Возвращает None, если прокси мертв или ошибка.
+    Для http-прокси можно передать общую session, чтобы не создавать новую.
     """
     timeout = aiohttp.ClientTimeout(total=3)
 
@@ -79,8 +87,14 @@ async def check_proxy_ping(proxy_type: str, ipport: str) -> float | None:
 
         if p_type == "http":
             proxy_url = f"http://{ipport}"
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(random.choice(test_urls), proxy=proxy_url) as resp:
+            async with contextlib.AsyncExitStack() as stack:
+                if session is None:
+                    session = await stack.enter_async_context(
+                        aiohttp.ClientSession(timeout=timeout)
+                    )
+                async with session.get(
+                    random.choice(test_urls), proxy=proxy_url, timeout=timeout
+                ) as resp:
                     if resp.status != 200:
                         return None
         else:
@@ -104,31 +118,171 @@ async def check_proxy_ping(proxy_type: str, ipport: str) -> float | None:
         return None
 
 
+async def _handshake(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    p_type: str,
+    host: str,
+    port: int,
+) -> bool:
+    if p_type == "socks5":
+        writer.write(b"\x05\x01\x00")
+        await writer.drain()
+        if await reader.readexactly(2) != b"\x05\x00":
+            return False
+        writer.write(
+            b"\x05\x01\x00\x01"
+            + ipaddress.IPv4Address(host).packed
+            + port.to_bytes(2, "big")
+        )
+        await writer.drain()
+        return (await reader.readexactly(10))[1] == 0
+    if p_type == "socks4":
+        writer.write(
+            b"\x04\x01"
+            + port.to_bytes(2, "big")
+            + ipaddress.IPv4Address(host).packed
+            + b"\x00"
+        )
+        await writer.drain()
+        return (await reader.readexactly(8))[1] == 0x5A
+    writer.write(
+        f"CONNECT {host}:{port} HTTP/1.1\r\nHost: {host}:{port}\r\n\r\n".encode()
+    )
+    await writer.drain()
+    status = (await reader.readline()).split()
+    return len(status) > 1 and status[1] == b"200"
+
+
+async def probe_proxy(
+    proxy_type: str, ipport: str, target: str = "1.1.1.1:443", max_wait: float = 3
+) -> float | None:
+    """Пинг в мс только до завершения SOCKS4/SOCKS5/HTTP CONNECT рукопожатия.
+
+    Целевой адрес фиксирован (IPv4:порт), тело страницы не запрашивается,
+    на всё даётся max_wait секунд. Возвращает None, если прокси не ответил
+    или отказал.
+    """
+    p_type = proxy_type.lower()
+    if p_type not in ("http", "socks4", "socks5"):
+        return None
+    host, port = ipport.rsplit(":", 1)
+    t_host, t_port = target.rsplit(":", 1)
+    writer = None
+    try:
+        async with asyncio.timeout(max_wait):
+            start = time.perf_counter()
+            reader, writer = await asyncio.open_connection(host, int(port))
+            if not await _handshake(reader, writer, p_type, t_host, int(t_port)):
+                return None
+        return round((time.perf_counter() - start) * 1000, 2)
+    except (OSError, TimeoutError, ValueError, asyncio.IncompleteReadError):
+        return None
+    finally:
+        if writer is not None:
+            writer.close()
+
+
 async def get_proxy_list() -> list[str]:
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                config.config.url.fp,
-                timeout=aiohttp.ClientTimeout(total=5),
-            ) as response:
-                response.raise_for_status()
-                return [
-                    line.strip() for line in (await response.text()).splitlines() if line.strip()
-                ]
+        async with web.session().get(
+            config.config.url.fp,
+            timeout=aiohttp.ClientTimeout(total=5),
+        ) as response:
+            response.raise_for_status()
+            return [
+                line.strip() for line in (await response.text()).splitlines() if line.strip()
+            ]
     except Exception:
         logger.trace("Ошибка при получении списка прокси")
         return []
 
 
-async def get_working_proxies(
+class Scoreboard:
+    """Статистика прокси между запусками: успехи, провалы и средний пинг.
+
+    Хранится в db/proxies.json как [ok, fail, пинг рукопожатия, пинг GET];
+    пинги разных режимов усредняются отдельно. По ней знакомые рабочие
+    прокси проверяются первыми.
+    """
+
+    KINDS = {"handshake": 2, "get": 3}
+
+    def __init__(self, path=pathes.proxies, max_size: int = 2000) -> None:
+        self.path = path
+        self.max_size = max_size
+        self._data: dict[str, list[float]] | None = None
+
+    async def load(self) -> dict[str, list[float]]:
+        if self._data is None:
+            try:
+                async with aiofiles.open(self.path, "rb") as f:
+                    self._data = orjson.loads(await f.read())
+            except (FileNotFoundError, orjson.JSONDecodeError):
+                self._data = {}
+        return self._data
+
+    def _entry(self, proxy: str) -> list[float]:
+        entry = self._data.get(proxy)
+        if entry is None:
+            return [0, 0, 0.0, 0.0]
+        if len(entry) == 3:
+            # Старый формат: один общий пинг, считаем его пингом GET.
+            return [entry[0], entry[1], 0.0, entry[2]]
+        return list(entry)
+
+    def score(self, proxy: str) -> tuple[float, float]:
+        ok, fail, handshake, get = self._entry(proxy)
+        return -(ok + 1) / (ok + fail + 2), get or handshake or float("inf")
+
+    def record(self, proxy: str, ok: bool | None, **latency: float) -> None:
+        """record(proxy, True, handshake=12.5, get=340.0) или record(proxy, False).
+
+        ok=None обновляет только пинг, не трогая счётчики.
+        """
+        entry = self._entry(proxy)
+        if ok is not None:
+            entry[0 if ok else 1] += 1
+        for kind, value in latency.items():
+            i = self.KINDS[kind]
+            avg = entry[i]
+            entry[i] = value if not avg else round(avg * 0.7 + value * 0.3, 2)
+        self._data[proxy] = entry
+
+    async def save(self) -> None:
+        if len(self._data) > self.max_size:
+            best = sorted(self._data, key=self.score)[: self.max_size]
+            self._data = {p: self._data[p] for p in best}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        async with aiofiles.open(tmp, "wb") as f:
+            await f.write(orjson.dumps(self._data))
+        await aiofiles.os.replace(tmp, self.path)
+
+
+scoreboard = Scoreboard()
+VERIFY_FACTOR = 3
+
+
+async def iter_working_proxies(
     proxy_type: str | None = None,
     count: int = 5,
-    max_concurrency: int = 100,
-) -> list[tuple[str, str, float]]:
-    """Возвращает список кортежей ("proxy_type", "ip:port", latency) отсортированный по latency.
+    max_concurrency: int | None = None,
+) -> AsyncIterator[tuple[str, str, float]]:
+    """Отдаёт ("proxy_type", "ip:port", latency) по мере прохождения проверки.
 
-    Проверки выполняются параллельно с ограничением `max_concurrency`.
+    Прокси с лучшей историей проверяются первыми; после `count` найденных
+    оставшиеся проверки отменяются. Режим задаётся секцией proxy_check
+    конфига: mode "handshake" меряет только рукопожатие с прокси, и при
+    verify полным GET проверяются только лучшие по рукопожатию кандидаты.
     """
+    opts = config.config.proxy_check or {}
+    mode = opts.get("mode", "handshake")
+    verify = opts.get("verify", True)
+    target = opts.get("target", "1.1.1.1:443")
+    if max_concurrency is None:
+        max_concurrency = opts.get("concurrency", 100)
+
     proxies = await get_proxy_list()
 
     if proxy_type == "socks5":
@@ -138,25 +292,152 @@ async def get_working_proxies(
     elif proxy_type == "http":
         proxies = [p for p in proxies if p.lower().startswith("http")]
 
-    sem = asyncio.Semaphore(max_concurrency)
+    if not proxies:
+        return
+    await scoreboard.load()
+    random.shuffle(proxies)
+    proxies.sort(key=scoreboard.score)
+
+    queue: asyncio.Queue[str] = asyncio.Queue()
+    for p in proxies:
+        queue.put_nowait(p)
 
-    async def _check(proxy_line: str):
+    if mode == "handshake" and verify:
+        async for result in _iter_verified(queue, count, max_concurrency, target):
+            yield result
+        return
+
+    results: asyncio.Queue[tuple[str, str, float] | None] = asyncio.Queue()
+
+    async def _worker(session: aiohttp.ClientSession):
+        while not queue.empty():
+            proxy_line = queue.get_nowait()
+            try:
+                ptype, ipport = proxy_line.split("://", 1)
+            except ValueError:
+                continue
+            if mode == "handshake":
+                kind, latency = "handshake", await probe_proxy(ptype, ipport, target)
+            else:
+                kind, latency = "get", await check_proxy_ping(ptype, ipport, session)
+            if latency is None:
+                scoreboard.record(proxy_line, False)
+                continue
+            scoreboard.record(proxy_line, True, **{kind: latency})
+            results.put_nowait((ptype, ipport, latency))
+
+    found = 0
+    async with aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=max_concurrency, force_close=True)
+    ) as session:
+        workers = [
+            asyncio.create_task(_worker(session))
+            for _ in range(min(max_concurrency, len(proxies)))
+        ]
+        done = asyncio.create_task(asyncio.wait(workers))
+        done.add_done_callback(lambda _: results.put_nowait(None))
         try:
-            ptype, ipport = proxy_line.split("://", 1)
-        except Exception:
-            return None
+            while found < count and (result := await results.get()) is not None:
+                found += 1
+                yield result
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            done.cancel()
+            await scoreboard.save()
 
-        async with sem:
-            latency = await check_proxy_ping(ptype, ipport)
 
-        if latency is None:
-            return None
-        return ptype, ipport, latency
+async def _handshake_batch(
+    queue: asyncio.Queue[str], need: int, concurrency: int, target: str
+) -> list[tuple[float, str, str, str]]:
+    "Рукопожатие до need успешных прокси: [(latency, type, ip:port, строка)]."
+    candidates: list[tuple[float, str, str, str]] = []
 
-    tasks = [asyncio.create_task(_check(p)) for p in proxies]
-    results = await asyncio.gather(*tasks)
+    async def _worker():
+        while len(candidates) < need and not queue.empty():
+            proxy_line = queue.get_nowait()
+            try:
+                ptype, ipport = proxy_line.split("://", 1)
+            except ValueError:
+                continue
+            latency = await probe_proxy(ptype, ipport, target)
+            if latency is None:
+                scoreboard.record(proxy_line, False)
+            else:
+                candidates.append((latency, ptype, ipport, proxy_line))
 
-    working = [r for r in results if r is not None]
-    working.sort(key=lambda x: x[2])
+    workers = min(concurrency, queue.qsize())
+    await asyncio.gather(*(_worker() for _ in range(workers)))
+    return sorted(candidates)
+
+
+async def _iter_verified(
+    queue: asyncio.Queue[str], count: int, concurrency: int, target: str
+) -> AsyncIterator[tuple[str, str, float]]:
+    """Двухступенчатая проверка: рукопожатие у всех, GET только у лучших.
+
+    За раунд полным GET проверяются VERIFY_FACTOR * (сколько ещё нужно)
+    лучших по рукопожатию кандидатов; остальные прошедшие рукопожатие ждут
+    следующего раунда, новые рукопожатия делаются, только если их не хватает.
+    """
+    found = 0
+    pool: list[tuple[float, str, str, str]] = []
+    async with aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=concurrency, force_close=True)
+    ) as session:
+
+        async def _verify(candidate):
+            handshake, ptype, ipport, proxy_line = candidate
+            get = await check_proxy_ping(ptype, ipport, session)
+            if get is None:
+                scoreboard.record(proxy_line, False, handshake=handshake)
+            else:
+                scoreboard.record(proxy_line, True, handshake=handshake, get=get)
+            return ptype, ipport, handshake, get
+
+        try:
+            while found < count and (pool or not queue.empty()):
+                need = (count - found) * VERIFY_FACTOR
+                if len(pool) < need and not queue.empty():
+                    pool += await _handshake_batch(
+                        queue, need - len(pool), concurrency, target
+                    )
+                    pool.sort()
+                candidates, pool = pool[:need], pool[need:]
+                tasks = [asyncio.create_task(_verify(c)) for c in candidates]
+                try:
+                    for next_done in asyncio.as_completed(tasks):
+                        ptype, ipport, handshake, get = await next_done
+                        if get is None:
+                            continue
+                        found += 1
+                        yield ptype, ipport, handshake
+                        if found >= count:
+                            break
+                finally:
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            for handshake, _, _, proxy_line in pool:
+                scoreboard.record(proxy_line, None, handshake=handshake)
+            await scoreboard.save()
 
-    return working[:count]
+
+async def get_working_proxies(
+    proxy_type: str | None = None,
+    count: int = 5,
+    max_concurrency: int | None = None,
+) -> list[tuple[str, str, float]]:
+    """Возвращает список кортежей ("proxy_type", "ip:port", latency) отсортированный по latency.
+
+    Проверки выполняются параллельно с ограничением `max_concurrency`
+    (по умолчанию proxy_check.concurrency) и прекращаются, как только найдено `count` рабочих прокси.
+    """
+    working = [
+        r
+        async for r in iter_working_proxies(proxy_type, count, max_concurrency)
+    ]
+    working.sort(key=lambda x: x[2])
+    return working
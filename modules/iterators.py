@@ -1,3 +1,5 @@
+from collections import OrderedDict
+
 from loguru import logger
 
 logger.info(f"Загружен модуль {__name__}!")
@@ -6,3 +8,23 @@ logger.info(f"Загружен модуль {__name__}!")
 class Counter(dict):
     def __missing__(self, key):
         return 0
+
+
+class LRU(OrderedDict):
+    "Словарь с вытеснением давно не использованных ключей."
+
+    def __init__(self, maxsize: int = 128):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
@@ -1,7 +1,9 @@
 import asyncio
+import bisect
+import hashlib
+import sqlite3
 from pathlib import Path
 
-import aiofiles
 from loguru import logger
 from telethon import TelegramClient
 
@@ -11,16 +13,71 @@ logger.info(f"Загружен модуль {__name__}!")
 
 
 class Notes:
+    """Заметки пользователя.
+
+    Тексты лежат в одном SQLite-файле (notes.db), фото - в media/ под именем
+    sha256 содержимого. Отсортированный каталог имён грузится один раз и
+    обновляется при добавлении/удалении, так что каталог на диске не сканируется.
+    """
+
     def __init__(self, number: str | int, base_dir: Path = pathes.notes) -> None:
         """Метод инициализации."""
         self.number = str(number)
         self.base_dir = base_dir
         self.user_dir = self.base_dir / self.number
+        self.db_path = self.user_dir / "notes.db"
+        self.media_dir = self.user_dir / "media"
+        self._db: sqlite3.Connection | None = None
+        self._names: list[str] = []
+        self._media: dict[str, str | None] = {}
+        self._lock = asyncio.Lock()
         logger.info(f"Инициализирован класс заметок для {self.number}")
 
-    async def _ensure_user_dir(self) -> None:
-        if not self.user_dir.exists():
-            await asyncio.to_thread(self.user_dir.mkdir, parents=True, exist_ok=True)
+    async def _ensure_loaded(self) -> None:
+        if self._db is not None:
+            return
+        async with self._lock:
+            if self._db is None:
+                await asyncio.to_thread(self._open)
+
+    def _open(self) -> None:
+        self.media_dir.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(self.db_path, check_same_thread=False)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS notes "
+            "(name TEXT PRIMARY KEY, text TEXT NOT NULL, media TEXT)"
+        )
+        self._migrate_legacy(db)
+        db.commit()
+        rows = db.execute("SELECT name, media FROM notes ORDER BY name").fetchall()
+        self._names = [name for name, _ in rows]
+        self._media = dict(rows)
+        self._db = db
+
+    def _migrate_legacy(self, db: sqlite3.Connection) -> None:
+        "Переносит заметки старого формата (<имя>.txt + <имя>.jpg) в базу."
+        for txt in self.user_dir.glob("*.txt"):
+            img = txt.with_suffix(".jpg")
+            media = self._store_media(img.read_bytes()) if img.exists() else None
+            db.execute(
+                "INSERT OR REPLACE INTO notes VALUES (?, ?, ?)",
+                (txt.stem, txt.read_text(encoding="utf-8"), media),
+            )
+            txt.unlink()
+            img.unlink(missing_ok=True)
+            logger.info(f"Заметка {txt.stem} перенесена в {self.db_path}")
+
+    def _store_media(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.media_dir / f"{digest}.jpg"
+        if not path.exists():
+            tmp = path.with_suffix(".tmp")
+            tmp.write_bytes(data)
+            tmp.replace(path)
+        return digest
+
+    def _media_path(self, digest: str | None) -> Path | None:
+        return self.media_dir / f"{digest}.jpg" if digest else None
 
     def _normalize_name(self, name: str) -> str:
         if not name or "/" in name or "\\" in name:
@@ -31,65 +88,83 @@ class Notes:
     async def add(self, name: str, text: str, client: TelegramClient, media=None) -> bool:
         try:
             norm_name = self._normalize_name(name)
-            await self._ensure_user_dir()
-            base_path = self.user_dir / f"{norm_name}.txt"
-
-            async with aiofiles.open(base_path, "w", encoding="utf-8") as f:
-                await f.write(text)
+            await self._ensure_loaded()
 
-            img_path = self.user_dir / f"{norm_name}.jpg"
+            digest = None
             if media and client:
-                await client.download_media(media, file=img_path)
+                data = await client.download_media(media, file=bytes)
+                digest = await asyncio.to_thread(self._store_media, data)
             elif media and not client:
                 logger.error("Для сохранения фото не передан клиент!")
                 return False
-            else:
-                if img_path.exists():
-                    img_path.unlink()
+
+            async with self._lock:
+                old = self._media.get(norm_name)
+                await asyncio.to_thread(self._write, norm_name, text, digest)
+                if norm_name not in self._media:
+                    bisect.insort(self._names, norm_name)
+                self._media[norm_name] = digest
+                await self._drop_unused_media(old)
             return True
         except Exception:
             logger.trace("Ошибка в Notes.add")
             return False
 
+    def _write(self, name: str, text: str, digest: str | None) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO notes VALUES (?, ?, ?)", (name, text, digest)
+        )
+        self._db.commit()
+
+    async def _drop_unused_media(self, digest: str | None) -> None:
+        if digest and digest not in self._media.values():
+            await asyncio.to_thread(self._media_path(digest).unlink, missing_ok=True)
+
     async def get(self, name: str) -> dict | None:
         try:
             norm_name = self._normalize_name(name)
-            base_path = self.user_dir / norm_name
-            txt_path = base_path.with_suffix(".txt")
-            img_path = base_path.with_suffix(".jpg")
-
-            if not txt_path.exists():
+            await self._ensure_loaded()
+            if norm_name not in self._media:
                 return None
 
-            async with aiofiles.open(txt_path, encoding="utf-8") as f:
-                text = await f.read()
+            async with self._lock:
+                row = await asyncio.to_thread(
+                    lambda: self._db.execute(
+                        "SELECT text, media FROM notes WHERE name = ?", (norm_name,)
+                    ).fetchone()
+                )
+            if row is None:
+                return None
 
-            return {
-                "text": text,
-                "media": img_path if img_path.exists() else None,
-            }
+            text, digest = row
+            return {"text": text, "media": self._media_path(digest)}
         except Exception:
             return None
 
     async def get_list(self) -> list[str]:
-        if not self.user_dir.exists():
-            return []
-        return sorted(f.stem for f in self.user_dir.iterdir() if f.suffix == ".txt")
+        await self._ensure_loaded()
+        return self._names.copy()
 
     async def get_by_index(self, index: int) -> dict | None:
-        names = await self.get_list()
-        if 1 <= index <= len(names):
-            return await self.get(names[index - 1])
+        await self._ensure_loaded()
+        if 1 <= index <= len(self._names):
+            return await self.get(self._names[index - 1])
         return None
 
     async def delete(self, name: str) -> bool:
         try:
             norm_name = self._normalize_name(name)
-            base_path = self.user_dir / norm_name
-            for ext in [".txt", ".jpg"]:
-                p = base_path.with_suffix(ext)
-                if p.exists():
-                    p.unlink()
+            await self._ensure_loaded()
+            async with self._lock:
+                await asyncio.to_thread(self._remove, norm_name)
+                if norm_name in self._media:
+                    digest = self._media.pop(norm_name)
+                    del self._names[bisect.bisect_left(self._names, norm_name)]
+                    await self._drop_unused_media(digest)
             return True
         except Exception:
             return False
+
+    def _remove(self, name: str) -> None:
+        self._db.execute("DELETE FROM notes WHERE name = ?", (name,))
+        self._db.commit()
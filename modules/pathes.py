@@ -9,7 +9,10 @@ tokens = Path("configs") / "tokens.yml"
 notes = Path("notes")
 clients = Path("clients")
 ai = Path("ai_chats")
-voice = Path("voice_cache")
+words = Path("db") / "words"
+autochat = Path("db") / "autochat"
 
 tasks = Path("db") / "tasks.json"
+geocode = Path("db") / "geocode.json"
+proxies = Path("db") / "proxies.json"
 animations = Path("animations") / "animations.json"
@@ -57,6 +57,8 @@ class autochat:
     invalid_time = "⚠️ : Укажи корректное время в секундах."
     too_fast = "🐢 : Интервал не может быть меньше 10 секунд."
     time_set = "⏱️ : Пауза между чатами установлена на {} сек."
+    mode_set = "📬 : Режим автопостинга: {}."
+    invalid_mode = "⚠️ : Режим должен быть spread или burst."
 
 
 class clear:
@@ -65,6 +67,7 @@ class clear:
     start = "🧹 : Начинаю чистку удалённых аккаунтов..."
     kick = "🧹 : Кикнуто {count} удалённых аккаунтов..."
     unban = "🧹 : Разбанено {count} удалённых из бан-листа..."
+    progress = "🧹 : Кикнуто {kicked}, разбанено {unbanned} удалённых аккаунтов..."
     done = "✅ : **Чистка завершена.**\nКикнуто из чата: {kicked}\nРазбанено из бан-листа: {unbanned}"
     not_found = "✅ : Удалённых аккаунтов не найдено."
 
@@ -0,0 +1,192 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from time import monotonic
+from typing import Any
+
+from loguru import logger
+from telethon import errors
+
+from . import config
+
+logger.info(f"Загружен модуль {__name__}!")
+
+
+class TokenBucket:
+    """Токен-бакет для запросов к Telegram.
+
+    rate - запросов в секунду, burst - сколько можно сделать подряд.
+    FloodWait блокирует бакет на указанное Telegram время, а call()
+    повторяет запрос после ожидания вместо того, чтобы его потерять.
+    Ожидание дольше max_wait секунд не пережидается: call() пробрасывает
+    FloodWaitError, пока блокировка не истечёт.
+    """
+
+    def __init__(
+        self, rate: float, burst: int = 1, max_wait: float | None = None
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self._tokens = float(burst)
+        self._updated = monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    @property
+    def backoff(self) -> float:
+        "Сколько секунд ещё действует FloodWait."
+        return max(0.0, self._blocked_until - monotonic())
+
+    def flood_wait(self, seconds: float) -> None:
+        self._blocked_until = max(self._blocked_until, monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def call(self, func: Callable[..., Awaitable], *args, **kwargs) -> Any:
+        while True:
+            if self.max_wait is not None and self.backoff > self.max_wait:
+                raise errors.FloodWaitError(request=None, capture=int(self.backoff))
+            await self.acquire()
+            try:
+                result = await func(*args, **kwargs)
+            except errors.FloodWaitError as e:
+                self.flood_wait(e.seconds)
+                if self.max_wait is not None and e.seconds > self.max_wait:
+                    logger.warning(f"FloodWait {e.seconds} с., пропускаю запрос")
+                    raise
+                logger.warning(f"FloodWait {e.seconds} с., жду")
+                continue
+            self.success()
+            return result
+
+    def success(self) -> None:
+        "Хук после успешного запроса."
+
+
+class AdaptiveLimiter(TokenBucket):
+    """Бакет, который сам подбирает темп.
+
+    После FloodWait скорость делится пополам (но не ниже min_rate), а каждые
+    recover успешных запросов подрастает на восьмую часть исходной.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        min_rate: float | None = None,
+        recover: int = 20,
+        max_rate: float | None = None,
+        max_wait: float | None = None,
+    ) -> None:
+        super().__init__(rate, burst, max_wait)
+        self.max_rate = max_rate or rate
+        self.min_rate = min_rate or rate / 16
+        self.recover = recover
+        self.last_wait = 0.0
+        self._streak = 0
+
+    def flood_wait(self, seconds: float) -> None:
+        super().flood_wait(seconds)
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.last_wait = seconds
+        self._streak = 0
+
+    def success(self) -> None:
+        self._streak += 1
+        if self._streak >= self.recover and self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 8)
+            self._streak = 0
+
+
+class Governor:
+    """Регулятор запросов одного аккаунта.
+
+    На каждый метод клиента (или тип TL-запроса) - свой AdaptiveLimiter, так
+    что FloodWait одного метода не тормозит остальные. Стартовый темп,
+    потолок, burst и max_wait берутся из секции governor конфига.
+    """
+
+    def __init__(self) -> None:
+        opts = config.config.governor or {}
+        self.rate = opts.get("rate", 3.0)
+        self.max_rate = opts.get("max_rate", 20.0)
+        self.burst = opts.get("burst", 3)
+        self.max_wait = opts.get("max_wait", 60)
+        self._buckets: dict[str, AdaptiveLimiter] = {}
+
+    def bucket(self, method: str) -> AdaptiveLimiter:
+        if (bucket := self._buckets.get(method)) is None:
+            bucket = self._buckets[method] = AdaptiveLimiter(
+                self.rate,
+                self.burst,
+                max_rate=self.max_rate,
+                max_wait=self.max_wait,
+            )
+        return bucket
+
+    async def call(self, func: Callable[..., Awaitable], *args, **kwargs) -> Any:
+        "governor.call(client.delete_dialog, ...) - бакет по имени метода."
+        return await self.bucket(func.__name__).call(func, *args, **kwargs)
+
+    async def request(self, client, request) -> Any:
+        "governor.request(client, SomeRequest(...)) - бакет по типу запроса."
+        return await self.bucket(type(request).__name__).call(client, request)
+
+    def state(self) -> dict[str, tuple[float, float, float]]:
+        "{метод: (текущий темп, сколько ещё ждать, последний FloodWait)}."
+        return {
+            method: (bucket.rate, bucket.backoff, bucket.last_wait)
+            for method, bucket in self._buckets.items()
+        }
+
+
+class ReadAcker:
+    """Объединяет отметки о прочтении.
+
+    ack() только запоминает наибольший id сообщения по чату, а раз в interval
+    секунд на каждый чат уходит один ReadHistory через governor.
+    """
+
+    def __init__(self, client, governor: Governor, interval: float = 0.5) -> None:
+        self.client = client
+        self.governor = governor
+        self.interval = interval
+        self._pending: dict[int, int] = {}
+        self._task: asyncio.Task | None = None
+
+    def ack(self, chat_id: int, msg_id: int) -> None:
+        if msg_id > self._pending.get(chat_id, 0):
+            self._pending[chat_id] = msg_id
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        while self._pending:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self) -> None:
+        pending, self._pending = self._pending, {}
+        for chat_id, max_id in pending.items():
+            try:
+                await self.governor.call(
+                    self.client.send_read_acknowledge, chat_id, max_id=max_id
+                )
+            except Exception:
+                logger.trace(f"Не удалось отметить прочитанным {chat_id}")
@@ -1,12 +1,16 @@
+import asyncio
 from pathlib import Path
 from typing import Any
 
 import aiofiles
+import aiofiles.os
 import orjson
 from loguru import logger
 
 from . import pathes
 
+FLUSH_RETRY_MAX = 60.0
+
 logger.info(f"Загружен модуль {__name__}!")
 
 default = {
@@ -18,6 +22,9 @@ default = {
     "mask.read": [],
     "luminto.reactions": True,
     "ai.model": None,
+    "ai.history_tokens": 6000,
+    "ai.stream": True,
+    "ai.stream_interval": 700,
     "use.ipv6": False,
     "auto.online": False,
     "token.geoapify": "",
@@ -27,6 +34,7 @@ default = {
     "autochat.ad_chat": -1002783775634,
     "autochat.ad_id": 589,
     "autochat.delay": 3600,
+    "autochat.mode": "spread",
     "autochat.enabled": False,
     "tg2vk.enabled": False,
     "tg2vk.chat": None,
@@ -51,13 +59,28 @@ default = {
 
 
 class UBSettings:
-    def __init__(self, number: str, path: Path = pathes.clients) -> None:
+    """Настройки клиента с отложенной записью на диск.
+
+    set/remove меняют данные в памяти сразу, а фоновый флашер объединяет
+    все изменения за flush_interval секунд в одну атомарную запись
+    (временный файл + rename). flush_interval <= 0 - запись при каждом изменении.
+    """
+
+    def __init__(
+        self, number: str, path: Path = pathes.clients, flush_interval: float = 1.0
+    ) -> None:
         self.filename = path / f"{number}.json"
+        self.flush_interval = flush_interval
         self._data: dict = None
+        self._dirty = False
+        self._flush_task: asyncio.Task | None = None
+        self._write_lock = asyncio.Lock()
 
     async def _ensure_loaded(self, forced=False) -> None:
         if not (self._data is None or forced):
             return
+        if self._data is not None:
+            await self.flush()
         if not self.filename.exists():
             self._data = {}
             return
@@ -68,6 +91,11 @@ class UBSettings:
     def _sync_ensure_loaded(self, forced=False) -> None:
         if not (self._data is None or forced):
             return
+        if self._data is not None and self._dirty:
+            self._dirty = False
+            tmp = self.filename.with_name(f"{self.filename.name}.tmp")
+            tmp.write_bytes(orjson.dumps(self._data, option=orjson.OPT_INDENT_2))
+            tmp.replace(self.filename)
         if not self.filename.exists():
             self._data = {}
             return
@@ -76,9 +104,8 @@ class UBSettings:
 
     async def make(self, api_id: int, api_hash: str) -> None:
         self._data = {"api_id": api_id, "api_hash": api_hash}
-        async with aiofiles.open(self.filename, "wb") as f:
-            content = orjson.dumps(self._data, option=orjson.OPT_INDENT_2)
-            await f.write(content)
+        self._dirty = True
+        await self.flush()
 
     async def get(self, name_setting: str, if_none: Any = None) -> Any:
         await self._ensure_loaded()
@@ -92,16 +119,58 @@ class UBSettings:
             return self._data.get(name_setting, if_none)
         return self._data.get(name_setting, default[name_setting])
 
+    async def keys(self, prefix: str = "") -> list[str]:
+        await self._ensure_loaded()
+        return [key for key in self._data if key.startswith(prefix)]
+
     async def set(self, key: str, value: Any) -> None:
         await self._ensure_loaded()
         self._data[key] = value
-        async with aiofiles.open(self.filename, "wb") as f:
-            content = orjson.dumps(self._data, option=orjson.OPT_INDENT_2)
-            await f.write(content)
+        await self._mark_dirty()
 
     async def remove(self, key: str):
         await self._ensure_loaded()
         del self._data[key]
-        async with aiofiles.open(self.filename, "wb") as f:
+        await self._mark_dirty()
+
+    async def _mark_dirty(self) -> None:
+        self._dirty = True
+        if self.flush_interval <= 0:
+            await self.flush()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self) -> None:
+        # Неудачная запись повторяется с растущей паузой, изменения,
+        # пришедшие во время записи, уходят следующим заходом.
+        delay = self.flush_interval
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.flush()
+            except Exception:
+                delay = min(delay * 2, FLUSH_RETRY_MAX)
+                logger.exception(
+                    f"Не удалось сохранить {self.filename}, повтор через {delay:.0f} с"
+                )
+                continue
+            if not self._dirty:
+                break
+            delay = self.flush_interval
+        self._flush_task = None
+
+    async def flush(self) -> None:
+        "Сразу записывает накопленные изменения (вызывать при остановке)."
+        async with self._write_lock:
+            if not self._dirty:
+                return
+            self._dirty = False
             content = orjson.dumps(self._data, option=orjson.OPT_INDENT_2)
-            await f.write(content)
+            tmp = self.filename.with_name(f"{self.filename.name}.tmp")
+            try:
+                async with aiofiles.open(tmp, "wb") as f:
+                    await f.write(content)
+                await aiofiles.os.replace(tmp, self.filename)
+            except Exception:
+                self._dirty = True
+                raise
@@ -1,12 +1,16 @@
 import asyncio
+import contextlib
+import heapq
 import random
 import time
-from collections.abc import Callable
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any, Literal
 
 import aiofiles
+import aiofiles.os
 import orjson
 from loguru import logger
 
@@ -20,6 +24,222 @@ TaskParam = int | str
 RandomDelay = tuple[int, int] | None
 
 
+class TaskStore:
+    """Общее на процесс хранилище состояния задач.
+
+    Состояние живёт в памяти, каждое изменение дописывается строкой в журнал
+    (tasks.journal), а раз в compact_every записей журнал сворачивается в
+    снимок tasks.json. Записи сериализуются одним asyncio.Lock.
+    """
+
+    _stores: dict[Path, "TaskStore"] = {}  # noqa: UP037
+
+    def __init__(
+        self, filename: Path = pathes.tasks, compact_every: int = 500
+    ) -> None:
+        self.filename = filename
+        self.journal = filename.with_suffix(".journal")
+        self.compact_every = compact_every
+        self._data: dict[str, dict[str, Any]] | None = None
+        self._pending = 0
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def shared(cls, filename: Path = pathes.tasks) -> "TaskStore":  # noqa: UP037
+        store = cls._stores.get(filename)
+        if store is None:
+            store = cls._stores[filename] = cls(filename)
+        return store
+
+    async def _ensure_loaded(self) -> None:
+        if self._data is not None:
+            return
+        async with self._lock:
+            if self._data is not None:
+                return
+            self.filename.parent.mkdir(parents=True, exist_ok=True)
+            data: dict[str, dict[str, Any]] = {}
+            try:
+                async with aiofiles.open(self.filename, "rb") as f:
+                    content = await f.read()
+                if content:
+                    data = orjson.loads(content)
+            except (FileNotFoundError, orjson.JSONDecodeError):
+                pass
+            try:
+                async with aiofiles.open(self.journal, "rb") as f:
+                    lines = (await f.read()).splitlines()
+            except FileNotFoundError:
+                lines = []
+            for line in lines:
+                try:
+                    key, value = orjson.loads(line)
+                except (orjson.JSONDecodeError, ValueError):
+                    continue
+                data[key] = value
+                self._pending += 1
+            self._data = data
+
+    async def get(self, key: str) -> dict[str, Any]:
+        await self._ensure_loaded()
+        return dict(self._data.get(key, {}))
+
+    async def put(self, key: str, value: dict[str, Any]) -> None:
+        await self._ensure_loaded()
+        self._data[key] = value
+        line = orjson.dumps([key, value]) + b"\n"
+        async with self._lock:
+            async with aiofiles.open(self.journal, "ab") as f:
+                await f.write(line)
+            self._pending += 1
+            if self._pending >= self.compact_every:
+                await self._compact()
+
+    async def compact(self) -> None:
+        await self._ensure_loaded()
+        async with self._lock:
+            await self._compact()
+
+    async def _compact(self) -> None:
+        tmp = self.filename.with_name(f"{self.filename.name}.tmp")
+        async with aiofiles.open(tmp, "wb") as f:
+            await f.write(orjson.dumps(self._data, option=orjson.OPT_INDENT_2))
+        await aiofiles.os.replace(tmp, self.filename)
+        async with aiofiles.open(self.journal, "wb"):
+            pass
+        self._pending = 0
+
+
+JOB_TIMEOUT = 300
+
+
+@dataclass(eq=False)
+class Job:
+    key: str
+    func: Callable[[], Awaitable]
+    next_after: Callable[[float], float]
+    next_run: float
+    paused: bool = False
+    running: bool = False
+    runs: int = 0
+    lag: float = 0.0
+    max_lag: float = 0.0
+    version: int = 0
+
+
+class Scheduler:
+    """Единый планировщик задач всех клиентов.
+
+    Задачи лежат в куче по времени следующего запуска; один цикл ждёт
+    ближайшую и отдаёт созревшие в ограниченный пул воркеров. Запуск
+    ограничен интервалом задачи (но не дольше JOB_TIMEOUT), чтобы зависший
+    клиент не занимал общий воркер.
+    """
+
+    def __init__(self, workers: int = 8) -> None:
+        self.workers = workers
+        self._jobs: dict[str, Job] = {}
+        self._heap: list[tuple[float, int, Job, int]] = []
+        self._seq = 0
+        self._wake = asyncio.Event()
+        self._queue: asyncio.Queue[Job] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+
+    def _ensure_started(self) -> None:
+        if self._tasks and not any(t.done() for t in self._tasks):
+            return
+        self.shutdown()
+        self._tasks = [asyncio.create_task(self._loop(), name="scheduler")]
+        self._tasks += [
+            asyncio.create_task(self._worker(), name=f"scheduler_worker_{i}")
+            for i in range(self.workers)
+        ]
+
+    def _push(self, job: Job) -> None:
+        job.version += 1
+        self._seq += 1
+        heapq.heappush(self._heap, (job.next_run, self._seq, job, job.version))
+        self._wake.set()
+
+    def add(self, job: Job) -> None:
+        self.remove(job.key)
+        self._jobs[job.key] = job
+        self._ensure_started()
+        self._push(job)
+
+    def remove(self, key: str) -> None:
+        job = self._jobs.pop(key, None)
+        if job:
+            job.version += 1
+
+    def pause(self, key: str) -> None:
+        if job := self._jobs.get(key):
+            job.paused = True
+            job.version += 1
+
+    def resume(self, key: str) -> None:
+        job = self._jobs.get(key)
+        if not job or not job.paused:
+            return
+        job.paused = False
+        if not job.running:
+            job.next_run = max(job.next_run, time.time())
+            self._push(job)
+
+    def get(self, key: str) -> Job | None:
+        return self._jobs.get(key)
+
+    def jobs(self) -> list[Job]:
+        return sorted(self._jobs.values(), key=lambda j: j.next_run)
+
+    async def _loop(self) -> None:
+        while True:
+            self._wake.clear()
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, job, version = heapq.heappop(self._heap)
+                if version != job.version or job.paused:
+                    continue
+                job.running = True
+                self._queue.put_nowait(job)
+            timeout = self._heap[0][0] - now if self._heap else None
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._wake.wait(), timeout)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            start = time.time()
+            job.lag = max(0.0, start - job.next_run)
+            job.max_lag = max(job.max_lag, job.lag)
+            limit = min(JOB_TIMEOUT, max(1.0, job.next_after(start) - start))
+            try:
+                async with asyncio.timeout(limit):
+                    await job.func()
+            except TimeoutError:
+                job.lag = max(job.lag, time.time() - job.next_run)
+                job.max_lag = max(job.max_lag, job.lag)
+                logger.warning(f"Задача {job.key} не уложилась в {limit:.0f} с.")
+            except Exception:
+                logger.exception(f"Ошибка в задаче {job.key}")
+            finally:
+                job.running = False
+                job.runs += 1
+                if self._jobs.get(job.key) is job:
+                    job.next_run = job.next_after(time.time())
+                    if not job.paused:
+                        self._push(job)
+                self._queue.task_done()
+
+    def shutdown(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+
+scheduler = Scheduler()
+
+
 class Generator:
     _instances: dict[str, "Generator"] = {}  # noqa: UP037
 
@@ -27,11 +247,12 @@ class Generator:
         logger.info(f"Инициализирован таск-ген {key_name}")
         self.key_name: str = key_name
         self.filename: Path = filename
-        self._task: asyncio.Task | None = None
+        self.store = TaskStore.shared(filename)
+        self.scheduler = scheduler
+        self._job: Job | None = None
         self._task_type: TaskType | None = None
         self._task_param: TaskParam | None = None
         self._random_delay: RandomDelay = None
-        self._next_run_timestamp: float = None
         Generator._instances[key_name] = self
 
     def _get_random_delay(self) -> float:
@@ -73,12 +294,15 @@ class Generator:
         last_run = data.get("last_run")
 
         if last_run is None or (now - last_run) >= interval:
-            asyncio.create_task(self._safe_execute_with_delay(func))
-            self._next_run_timestamp = now + interval
+            next_run = now
         else:
-            self._next_run_timestamp = last_run + interval
+            next_run = last_run + interval
 
-        self._task = asyncio.create_task(self._worker(func, interval))
+        self._add_job(
+            func,
+            next_run + self._get_random_delay(),
+            lambda done: done + interval + self._get_random_delay(),
+        )
 
     async def _schedule_daily_task(self, func: Callable, time_str: str) -> None:
         try:
@@ -86,34 +310,31 @@ class Generator:
         except ValueError as e:
             raise ValueError("Неверный формат времени. Используйте 'HH:MM'.") from e
 
-        self._next_run_timestamp = self._get_next_daily_run(target_time)
+        next_run = self._get_next_daily_run(target_time)
         data = await self._get_task_data()
         last_run = data.get("last_run")
 
-        if last_run is None or last_run < self._next_run_timestamp - 86400:
-            asyncio.create_task(self._safe_execute_with_delay(func))
-
-        self._task = asyncio.create_task(self._daily_worker(func, target_time))
+        if last_run is None or last_run < next_run - 86400:
+            next_run = time.time()
 
-    async def _worker(self, func: Callable, interval: float) -> None:
-        while True:
-            sleep_duration = max(0.0, self._next_run_timestamp - time.time())
-            await asyncio.sleep(sleep_duration)
-            await self._safe_execute_with_delay(func)
-            self._next_run_timestamp = time.time() + interval
-
-    async def _daily_worker(self, func: Callable, target_time) -> None:
-        while True:
-            sleep_duration = max(0.0, self._next_run_timestamp - time.time())
-            await asyncio.sleep(sleep_duration)
-            await self._safe_execute_with_delay(func)
-            self._next_run_timestamp = self._get_next_daily_run(target_time)
+        self._add_job(
+            func,
+            next_run + self._get_random_delay(),
+            lambda _: (
+                self._get_next_daily_run(target_time) + self._get_random_delay()
+            ),
+        )
 
-    async def _safe_execute_with_delay(self, func: Callable) -> None:
-        delay = self._get_random_delay()
-        if delay > 0:
-            await asyncio.sleep(delay)
-        await self._safe_execute(func)
+    def _add_job(
+        self, func: Callable, next_run: float, next_after: Callable[[float], float]
+    ) -> None:
+        self._job = Job(
+            key=self.key_name,
+            func=lambda: self._safe_execute(func),
+            next_after=next_after,
+            next_run=next_run,
+        )
+        self.scheduler.add(self._job)
 
     async def _safe_execute(self, func: Callable) -> None:
         start = time.time()
@@ -135,39 +356,23 @@ class Generator:
             target += timedelta(days=1)
         return target.timestamp()
 
-    async def _ensure_directory_exists(self) -> None:
-        directory = Path(self.filename).parent
-        directory.mkdir(parents=True, exist_ok=True)
-
-    async def _get_all_data(self) -> dict[str, Any]:
-        await self._ensure_directory_exists()
-        try:
-            async with aiofiles.open(self.filename, "rb") as f:
-                content = await f.read()
-                if not content:
-                    return {}
-                return orjson.loads(content)
-        except (FileNotFoundError, orjson.JSONDecodeError):
-            return {}
-
     async def _get_task_data(self) -> dict[str, Any]:
-        return (await self._get_all_data()).get(self.key_name, {})
+        return await self.store.get(self.key_name)
 
     async def _update_task_data(self, last_run: float) -> None:
-        await self._ensure_directory_exists()
-        data = await self._get_all_data()
-        data[self.key_name] = {
-            "last_run": last_run,
-            "task_type": self._task_type,
-            "task_param": self._task_param,
-            "random_delay": self._random_delay,
-        }
-        async with aiofiles.open(self.filename, "wb") as f:
-            await f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        await self.store.put(
+            self.key_name,
+            {
+                "last_run": last_run,
+                "task_type": self._task_type,
+                "task_param": self._task_param,
+                "random_delay": self._random_delay,
+            },
+        )
 
     async def info(self) -> float | None:
         data = await self._get_task_data()
-        if not self._task or self._next_run_timestamp is None:
+        if self._job is None:
             if not data:
                 return None
             task_type = data.get("task_type")
@@ -190,13 +395,18 @@ class Generator:
             else:
                 return None
             return max(0.0, next_run - time.time())
-        return max(0.0, self._next_run_timestamp - time.time())
+        return max(0.0, self._job.next_run - time.time())
+
+    def pause(self) -> None:
+        self.scheduler.pause(self.key_name)
+
+    def resume(self) -> None:
+        self.scheduler.resume(self.key_name)
 
     def stop(self) -> None:
-        if self._task and not self._task.done():
-            self._task.cancel()
-        self._task = None
-        self._next_run_timestamp = None
+        if self._job is not None:
+            self.scheduler.remove(self.key_name)
+        self._job = None
 
     @classmethod
     async def cleanup(cls) -> None:
@@ -1,49 +1,151 @@
+import asyncio
+import importlib.util
+import threading
 from datetime import datetime
+from time import monotonic
 
+import aiofiles
+import aiofiles.os
 import aiohttp
+import orjson
 import pytz
 from geopy.geocoders import Nominatim
 from loguru import logger
 
-from . import config
+from . import config, format, iterators, pathes, web
 
 logger.info(f"Загружен модуль {__name__}!")
 
-try:
-    from timezonefinder import TimezoneFinder  # type: ignore
-
-    tf = TimezoneFinder()
-
-    async def get_timezone(lat, lon, api_key) -> str:
-        return tf.timezone_at(
-            lng=lon,
-            lat=lat,
-        )
+_HAS_TF = importlib.util.find_spec("timezonefinder") is not None
+_finder = None
+_finder_lock = threading.Lock()
+# (lat, lon) с шагом 0.01° -> имя часового пояса
+_tz_cache: iterators.LRU = iterators.LRU(1024)
 
+if _HAS_TF:
     logger.info("Использую timezonefinder")
-except ModuleNotFoundError:
+else:
     logger.warning("Использую geoapify, так как timezonefinder не установлен.")
 
-    async def get_timezone(lat, lon, api_key) -> str | None:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                config.config.url.geoapify,
-                params={
-                    "lat": lat,
-                    "lon": lon,
-                    "format": "json",
-                    "apiKey": api_key,
-                },
-                timeout=aiohttp.ClientTimeout(total=5),
-            ) as r:
-                if r.status != 200:
-                    return None
-                data = await r.json()
-                return data["results"][0]["timezone"]["name"]
+
+def _timezone_at(lat, lon) -> str | None:
+    """TimezoneFinder создаётся при первом вызове и читает данные с диска.
+
+    Файлы он читает через общие дескрипторы (seek + read), поэтому и поиск
+    идёт под локом.
+    """
+    global _finder
+    with _finder_lock:
+        if _finder is None:
+            from timezonefinder import TimezoneFinder  # type: ignore
+
+            _finder = TimezoneFinder(in_memory=False)
+        return _finder.timezone_at(lng=lon, lat=lat)
+
+
+async def _geoapify_timezone(lat, lon, api_key) -> str | None:
+    async with web.session().get(
+        config.config.url.geoapify,
+        params={
+            "lat": lat,
+            "lon": lon,
+            "format": "json",
+            "apiKey": api_key,
+        },
+        timeout=aiohttp.ClientTimeout(total=5),
+    ) as r:
+        if r.status != 200:
+            return None
+        data = await r.json()
+        return data["results"][0]["timezone"]["name"]
+
+
+async def get_timezone(lat, lon, api_key) -> str | None:
+    key = (round(lat, 2), round(lon, 2))
+    if (name := _tz_cache.get(key)) is not None:
+        return name
+    if _HAS_TF:
+        name = await asyncio.to_thread(_timezone_at, lat, lon)
+    else:
+        name = await _geoapify_timezone(lat, lon, api_key)
+    if name:
+        _tz_cache[key] = name
+    return name
 
 
 geolocator = Nominatim(user_agent="geo_assistant")
 
+# город -> {"lat", "lon", "address", "tz"}
+_places: dict[str, dict] | None = None
+_inflight: dict[str, asyncio.Task] = {}
+_nominatim_lock = asyncio.Lock()
+_nominatim_last = 0.0
+
+
+async def _load_places() -> dict[str, dict]:
+    global _places
+    if _places is None:
+        try:
+            async with aiofiles.open(pathes.geocode, "rb") as f:
+                _places = orjson.loads(await f.read())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            _places = {}
+    return _places
+
+
+async def _save_places() -> None:
+    pathes.geocode.parent.mkdir(parents=True, exist_ok=True)
+    tmp = pathes.geocode.with_suffix(".tmp")
+    async with aiofiles.open(tmp, "wb") as f:
+        await f.write(orjson.dumps(_places, option=orjson.OPT_INDENT_2))
+    await aiofiles.os.replace(tmp, pathes.geocode)
+
+
+async def _geocode(city: str):
+    "Nominatim в потоке, не чаще запроса в секунду на процесс."
+    global _nominatim_last
+    async with _nominatim_lock:
+        wait = _nominatim_last + 1.0 - monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        try:
+            return await asyncio.to_thread(geolocator.geocode, city)
+        finally:
+            _nominatim_last = monotonic()
+
+
+async def _resolve(key: str, city: str, api_key) -> dict | None:
+    location = await _geocode(city)
+    if not location:
+        return None
+    place = {
+        "lat": location.latitude,
+        "lon": location.longitude,
+        "address": location.address,
+        "tz": await get_timezone(location.latitude, location.longitude, api_key),
+    }
+    if place["tz"]:
+        (await _load_places())[key] = place
+        await _save_places()
+    return place
+
+
+async def locate(city: str, api_key=None) -> dict | None:
+    """Координаты, адрес и часовой пояс города.
+
+    Ответы хранятся в db/geocode.json, повторные запросы не уходят в сеть;
+    одновременные запросы одного города ждут один общий.
+    """
+    key = format.normalize_city(city)
+    if place := (await _load_places()).get(key):
+        return place
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_resolve(key, city, api_key))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(task)
+
 
 def time(timezone_name):
     try:
@@ -11,6 +11,8 @@ from telethon.tl.functions.messages import ImportChatInviteRequest
 from telethon.tl.types import Message
 from vkbottle import API
 
+from . import ratelimit
+
 SettingsType = Any
 LoggerType = logging.Logger
 
@@ -23,9 +25,12 @@ class TaskResult:
 
 
 class VKActions:
-    def __init__(self, token: str, logger: LoggerType) -> None:
+    def __init__(
+        self, token: str, logger: LoggerType, governor: "ratelimit.Governor"
+    ) -> None:
         self.token = token
         self.logger = logger
+        self.governor = governor
         self.api = API(token)
 
     async def init(self) -> None:
@@ -138,12 +143,14 @@ class VKActions:
             if "+/" in url or "joinchat" in url:
                 invite_hash = url.split("/")[-1]
                 invite_hash = invite_hash.split("?")[0]
-                await client(ImportChatInviteRequest(invite_hash))
+                await self.governor.request(
+                    client, ImportChatInviteRequest(invite_hash)
+                )
             else:
                 username = (
                     url.replace("https://t.me/", "").replace("http://t.me/", "").split("/")[0]
                 )
-                await client(JoinChannelRequest(username))
+                await self.governor.request(client, JoinChannelRequest(username))
             return TaskResult(True, "tg_join", "Успешно подписан на TG")
         except Exception as e:
             err_str = str(e)
@@ -166,13 +173,15 @@ class VKActions:
             if chat_ref == "c":
                 chat_id = int(parts[-3]) if len(parts) > 3 else int(parts[-2])
                 try:
-                    entity = await client.get_entity(chat_id)
+                    entity = await self.governor.call(client.get_entity, chat_id)
                 except Exception:
-                    entity = await client.get_entity(int(parts[-3]))
+                    entity = await self.governor.call(
+                        client.get_entity, int(parts[-3])
+                    )
             else:
-                entity = await client.get_entity(chat_ref)
+                entity = await self.governor.call(client.get_entity, chat_ref)
             if entity:
-                await client.get_messages(entity, ids=post_id)
+                await self.governor.call(client.get_messages, entity, ids=post_id)
                 return TaskResult(True, "tg_view", "Пост просмотрен")
             return TaskResult(False, "tg_view", "Не удалось получить сущность")
         except Exception as e:
@@ -181,10 +190,17 @@ class VKActions:
 
 
 class VKTargetRefactored:
-    def __init__(self, client: TelegramClient, settings: SettingsType, logger: LoggerType) -> None:
+    def __init__(
+        self,
+        client: TelegramClient,
+        settings: SettingsType,
+        logger: LoggerType,
+        governor: "ratelimit.Governor",
+    ) -> None:
         self.client = client
         self.settings = settings
         self.logger = logger
+        self.governor = governor
         self.vk: VKActions | None = None
         self._poll_task: asyncio.Task | None = None
         self._active = False
@@ -197,7 +213,7 @@ class VKTargetRefactored:
         if not token:
             self.logger.error("❌ VK Token не найден!")
             return
-        self.vk = VKActions(token, self.logger)
+        self.vk = VKActions(token, self.logger, self.governor)
         await self.vk.init()
         self._active = True
 
@@ -218,6 +234,9 @@ class VKTargetRefactored:
             self._poll_task.cancel()
         self.logger.info("VKTarget Automation остановлен")
 
+    async def _request_tasks(self) -> None:
+        await self.governor.call(self.client.send_message, "vktarget_bot", "Задания")
+
     async def _poll_loop(self) -> None:
         try:
             await asyncio.sleep(5)
@@ -229,7 +248,7 @@ class VKTargetRefactored:
                     break
                 if not self._lock.locked():
                     try:
-                        await self.client.send_message("vktarget_bot", "Задания")
+                        await self._request_tasks()
                     except Exception:
                         pass
         except asyncio.CancelledError:
@@ -243,7 +262,7 @@ class VKTargetRefactored:
         text = event.text or ""
         if not text:
             return
-        await event.mark_read()
+        await self.governor.call(event.mark_read)
         lower_text = text.lower()
         if any(
             k in lower_text
@@ -259,9 +278,8 @@ class VKTargetRefactored:
             self._empty_count += 1
             return
         if "доступны новые задания" in lower_text:
-            await asyncio.sleep(1)
             if not self._lock.locked():
-                await self.client.send_message("vktarget_bot", "Задания")
+                await self._request_tasks()
             return
         links = re.findall(r"\]\(([^)]+)\)", text)
         if not links:
@@ -307,10 +325,10 @@ class VKTargetRefactored:
         try:
             btn_text = "Проверить" if result.success else "Скрыть"
             self.logger.info(f"Нажимаю: {btn_text} ({result.message})")
-            await event.click(text=btn_text)
+            await self.governor.call(event.click, text=btn_text)
             await asyncio.sleep(random.uniform(1.5, 2.5))
             if self._active and not self._lock.locked():
-                await self.client.send_message("vktarget_bot", "Задания")
+                await self._request_tasks()
         except ValueError:
             self.logger.warning(f"Кнопка '{btn_text}' не найдена. Возможно, сообщение обновилось.")
         except Exception as e:
@@ -320,7 +338,7 @@ class VKTargetRefactored:
                 self.logger.error(f"Ошибка клика: {e}")
             await asyncio.sleep(2)
             if self._active:
-                await self.client.send_message("vktarget_bot", "Задания")
+                await self._request_tasks()
 
     async def close(self) -> None:
         self.stop()
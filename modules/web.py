@@ -0,0 +1,36 @@
+import aiohttp
+from loguru import logger
+
+from . import config
+
+logger.info(f"Загружен модуль {__name__}!")
+
+_session: aiohttp.ClientSession | None = None
+
+
+def session() -> aiohttp.ClientSession:
+    """Общая на процесс HTTP-сессия с пулом keep-alive соединений и DNS-кешем.
+
+    Параметры берутся из секции http конфига: timeout, limit, limit_per_host,
+    dns_ttl.
+    """
+    global _session
+    if _session is None or _session.closed:
+        opts = config.config.http or {}
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=opts.get("limit", 100),
+                limit_per_host=opts.get("limit_per_host", 10),
+                ttl_dns_cache=opts.get("dns_ttl", 300),
+                keepalive_timeout=30,
+            ),
+            timeout=aiohttp.ClientTimeout(total=opts.get("timeout", 10)),
+        )
+    return _session
+
+
+async def close() -> None:
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
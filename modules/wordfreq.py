@@ -0,0 +1,114 @@
+import asyncio
+import heapq
+import multiprocessing
+import os
+import re
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import aiofiles
+import aiofiles.os
+import orjson
+from loguru import logger
+
+logger.info(f"Загружен модуль {__name__}!")
+
+_PUNCT = re.compile(r"[^\w\s]+")
+_executor: Executor | None = None
+
+
+def count_words(texts: list[str]) -> Counter:
+    """Частоты слов в пачке текстов.
+
+    Слово - последовательность без пробелов, очищенная от не-буквенных
+    символов и приведённая к нижнему регистру; числа пропускаются.
+    """
+    counts = Counter(_PUNCT.sub("", "\n".join(texts).lower()).split())
+    for word in [w for w in counts if w.isdigit()]:
+        del counts[word]
+    return counts
+
+
+def _get_executor() -> Executor:
+    """Пул процессов на forkserver.
+
+    Обычный fork процесса с запущенным циклом, потоками и сокетами Telethon
+    может унести в дочерний процесс захваченный лок. Где forkserver нет,
+    слова считаются в отдельном потоке.
+    """
+    global _executor
+    if _executor is None:
+        try:
+            _executor = ProcessPoolExecutor(
+                max_workers=min(2, os.cpu_count() or 1),
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+        except (ImportError, NotImplementedError, OSError, ValueError):
+            logger.warning("Пул процессов недоступен, слова считаются в потоке")
+            _executor = ThreadPoolExecutor(max_workers=1)
+    return _executor
+
+
+def submit(texts: list[str]) -> asyncio.Future:
+    "Отправляет пачку текстов на подсчёт в пул процессов, не блокируя цикл."
+    return asyncio.get_running_loop().run_in_executor(
+        _get_executor(), count_words, texts
+    )
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+
+class WordIndex:
+    """Сохраняемый на диск частотный словарь одного чата.
+
+    Хранит id последнего обработанного сообщения, так что повторный
+    .слов дочитывает только новые сообщения.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.last_id = 0
+        self.total = 0
+        self.counts: Counter = Counter()
+
+    async def load(self) -> None:
+        try:
+            async with aiofiles.open(self.path, "rb") as f:
+                data = orjson.loads(await f.read())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            return
+        self.last_id = data["last_id"]
+        self.total = data["total"]
+        self.counts = Counter(data["counts"])
+
+    def merge(self, counts: Counter, messages: int, last_id: int) -> None:
+        self.counts.update(counts)
+        self.total += messages
+        self.last_id = max(self.last_id, last_id)
+
+    async def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        async with aiofiles.open(tmp, "wb") as f:
+            await f.write(
+                orjson.dumps(
+                    {
+                        "last_id": self.last_id,
+                        "total": self.total,
+                        "counts": self.counts,
+                    }
+                )
+            )
+        await aiofiles.os.replace(tmp, self.path)
+
+    def top(self, k: int, min_len: int | None = None) -> list[tuple[str, int]]:
+        items = self.counts.items()
+        if min_len is not None:
+            items = ((w, n) for w, n in items if len(w) >= min_len)
+        return heapq.nlargest(k, items, key=lambda i: i[1])